@@ -3,8 +3,22 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 import streamlit as st
+import shapely
 from shapely.geometry import Point, Polygon, MultiPolygon
 import time
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import dask_geopandas
+except ImportError:
+    dask_geopandas = None
+
+logger = logging.getLogger(__name__)
+
+# Boundary x dataset feature count above which joins are partitioned with dask-geopandas
+LARGE_JOIN_THRESHOLD = 50_000_000
 
 class SuitabilityAnalyzer:
     """
@@ -40,8 +54,9 @@ class SuitabilityAnalyzer:
         if not project.criteria:
             raise ValueError("At least one criterion is required for analysis")
         
-        # Get a copy of the boundary dataset
-        result_gdf = project.boundary_dataset.copy()
+        # Get a shallow copy of the boundary dataset; the analysis only adds or
+        # replaces columns, so the geometries can be shared with the project
+        result_gdf = project.boundary_dataset.copy(deep=False)
         
         # Process each criterion
         criterion_results = {}
@@ -49,26 +64,46 @@ class SuitabilityAnalyzer:
         st.info("Starting analysis...")
         progress_bar = st.progress(0.0)
         
-        # Process each criterion
-        for i, criterion in enumerate(project.criteria):
-            # Update progress
-            progress = (i / len(project.criteria)) * 0.7
-            progress_bar.progress(progress)
-            
-            # Display processing message
-            st.write(f"Processing: {criterion.name}")
-            
-            # Get the dataset
-            dataset = project.datasets.get(criterion.data_source)
+        # Gather each criterion's inputs up front; the project caches are only touched from this thread
+        jobs = []
+        for criterion in project.criteria.values():
+            # Get the dataset in the boundary CRS (reprojections are cached by the project)
+            dataset = project.get_dataset(criterion.data_source, result_gdf.crs)
             if dataset is None:
                 raise ValueError(f"Dataset not found for criterion: {criterion.name}")
             
-            # Process the criterion
-            criterion_scores = self._process_criterion(result_gdf, dataset, criterion)
+            # Area, distance and coverage calculations use the metric copies prepared by the project
+            metric_data = None
+            if criterion.processing_method in ('Area Within Boundary', 'Distance to Nearest', 'Percent Coverage'):
+                metric_data = (project.boundary_metric, project.get_metric_dataset(criterion.data_source))
+            
+            jobs.append((criterion, dataset, metric_data))
+        
+        # Criteria are independent, so process them concurrently. Threads rather than
+        # processes: shapely releases the GIL in its vectorized GEOS calls, and the
+        # cached datasets and their spatial indexes can be shared without pickling
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for criterion, dataset, metric_data in jobs:
+                # Display processing message
+                st.write(f"Processing: {criterion.name}")
+                futures[executor.submit(self._process_criterion, result_gdf, dataset, criterion, metric_data)] = criterion
             
-            # Store results
+            # Update progress from this thread as criteria finish
+            outcomes_by_id = {}
+            for done, future in enumerate(as_completed(futures), start=1):
+                outcomes_by_id[futures[future].id] = future.result()
+                progress_bar.progress((done / len(jobs)) * 0.7)
+        
+        # Store results in criteria order, showing their warnings from this thread;
+        # Streamlit drops messages sent from the worker threads
+        for criterion in project.criteria.values():
+            scores, warnings = outcomes_by_id[criterion.id]
+            for warning in warnings:
+                st.warning(warning)
             criterion_results[criterion.id] = {
-                'scores': criterion_scores,
+                'scores': scores,
                 'criterion': criterion
             }
         
@@ -81,34 +116,47 @@ class SuitabilityAnalyzer:
         else:  # boolean
             result_gdf = self._apply_boolean(result_gdf, criterion_results)
         
+        # Round once here so the display code doesn't have to on every rerun;
+        # float32 is plenty for two decimal places and halves the column size
+        result_gdf['suitability_score'] = result_gdf['suitability_score'].round(2).astype(np.float32)
+        
         progress_bar.progress(1.0)
         
         # Return the result
         return result_gdf
     
-    def _process_criterion(self, boundary_gdf, dataset, criterion):
+    def _process_criterion(self, boundary_gdf, dataset, criterion, metric_data=None):
         """
-        Process a single criterion.
+        Process a single criterion. Runs in a worker thread, so it logs instead of
+        printing and returns its warnings rather than showing them.
         
         Args:
             boundary_gdf: GeoDataFrame containing boundary features
             dataset: GeoDataFrame containing dataset for the criterion
             criterion: Criterion object
+            metric_data: Optional (boundary, dataset) pair already projected to a metric CRS,
+                used by the area, distance and coverage methods
             
         Returns:
-            pandas.Series: Scores for each boundary feature
+            tuple: (pandas.Series of scores for each boundary feature,
+                list of warning messages for the user)
         """
         method = criterion.processing_method
         column = criterion.column
+        warnings = []
 
         # Check datasets CRS
-        print(f"Boundary CRS: {boundary_gdf.crs}")
-        print(f"Dataset CRS: {dataset.crs}")
+        logger.debug("%s: boundary CRS %s, dataset CRS %s", criterion.name, boundary_gdf.crs, dataset.crs)
 
         # Ensure both are in same CRS
         if dataset.crs != boundary_gdf.crs:
             dataset = dataset.to_crs(boundary_gdf.crs)
-            print(f"Converted dataset to CRS: {dataset.crs}")
+            logger.debug("%s: converted dataset to CRS %s", criterion.name, dataset.crs)
+
+        # Project datasets come with their spatial index prebuilt; building it here stalls
+        # the first query. Direct Value reads the boundary's own column and needs no index
+        if method != 'Direct Value' and not dataset.has_sindex:
+            logger.warning("No spatial index on dataset for %s, building it during analysis", criterion.name)
 
         # Initialize scores
         scores = pd.Series(0.0, index=boundary_gdf.index)
@@ -122,196 +170,253 @@ class SuitabilityAnalyzer:
             scores = boundary_gdf[column].copy()
         
         elif method == 'Count Features':
-            # Count features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                # Try buffer to handle precision issues
-                buffered = boundary.geometry.buffer(0.00001)  # Small buffer
-                count = dataset[dataset.intersects(buffered)].shape[0]
-                name_field = next((col for col in boundary_gdf.columns if 'name' in col.lower()), None)
-                name = boundary[name_field] if name_field else f"Feature {i}"
-                print(f"County: {name}, Count: {count}")
-                scores.iloc[i] = count
-        
-        elif method == 'Sum Values':
-            if not column:
-                raise ValueError(f"Column required for 'Sum Values' method in criterion: {criterion.name}")
-            
-            # Sum values for features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    scores.iloc[i] = intersecting[column].sum()
-        
-        elif method == 'Average Values':
-            if not column:
-                raise ValueError(f"Column required for 'Average Values' method in criterion: {criterion.name}")
-            
-            # Average values for features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    scores.iloc[i] = intersecting[column].mean()
-        
-        elif method == 'Minimum Value':
-            if not column:
-                raise ValueError(f"Column required for 'Minimum Value' method in criterion: {criterion.name}")
-            
-            # Find minimum value for features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    scores.iloc[i] = intersecting[column].min()
+            # Count features within each boundary, with a small tolerance to handle precision issues
+            if (dataset.geom_type == 'Point').all():
+                # Points can be matched by distance directly, without building buffered boundaries
+                boundary_pos, _ = dataset.sindex.query(boundary_gdf.geometry, predicate='dwithin', distance=0.00001)
+                counts = np.bincount(boundary_pos, minlength=len(boundary_gdf))
+                scores = pd.Series(counts.astype(np.float64), index=boundary_gdf.index, copy=False)
+            else:
+                boundary_pos, dataset_pos = self._intersecting_pairs(dataset, boundary_gdf.geometry.buffer(0.00001))
+                scores = self._aggregate_by_boundary(dataset_pos, boundary_pos, boundary_gdf, 'size')
         
-        elif method == 'Maximum Value':
+        elif method in ('Sum Values', 'Average Values', 'Minimum Value', 'Maximum Value'):
             if not column:
-                raise ValueError(f"Column required for 'Maximum Value' method in criterion: {criterion.name}")
+                raise ValueError(f"Column required for '{method}' method in criterion: {criterion.name}")
             
-            # Find maximum value for features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    scores.iloc[i] = intersecting[column].max()
+            # Aggregate values of the features within each boundary
+            aggregation = {
+                'Sum Values': 'sum',
+                'Average Values': 'mean',
+                'Minimum Value': 'min',
+                'Maximum Value': 'max'
+            }[method]
+            boundary_pos, dataset_pos = self._intersecting_pairs(dataset, boundary_gdf.geometry)
+            values = dataset[column].to_numpy()[dataset_pos]
+            scores = self._aggregate_by_boundary(values, boundary_pos, boundary_gdf, aggregation)
         
         elif method == 'Area Within Boundary':
-            # Convert to a projected CRS for accurate area calculations
-            local_boundary_gdf = boundary_gdf.to_crs("EPSG:3857")  # Web Mercator projection
-            local_dataset = dataset.to_crs("EPSG:3857")  
+            # Use a projected CRS for accurate area calculations
+            if metric_data is not None:
+                local_boundary_gdf, local_dataset = metric_data
+            else:
+                metric_crs = boundary_gdf.estimate_utm_crs()
+                local_boundary_gdf = boundary_gdf.to_crs(metric_crs)
+                local_dataset = dataset.to_crs(metric_crs)
             
             # Calculate area of features within each boundary
-            for i, boundary in local_boundary_gdf.iterrows():
-                intersecting = local_dataset[local_dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    area = sum(intersecting.geometry.intersection(boundary.geometry).area)
-                    scores.iloc[i] = area
+            boundary_pos, dataset_pos = self._intersecting_pairs(local_dataset, local_boundary_gdf.geometry)
+            areas = self._clipped(local_dataset, dataset_pos, local_boundary_gdf, boundary_pos).area
+            scores = self._aggregate_by_boundary(areas, boundary_pos, boundary_gdf, 'sum')
         
         elif method == 'Length Within Boundary':
             # Calculate length of features within each boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    length = sum(intersecting.geometry.intersection(boundary.geometry).length)
-                    scores.iloc[i] = length
+            boundary_pos, dataset_pos = self._intersecting_pairs(dataset, boundary_gdf.geometry)
+            lengths = self._clipped(dataset, dataset_pos, boundary_gdf, boundary_pos).length
+            scores = self._aggregate_by_boundary(lengths, boundary_pos, boundary_gdf, 'sum')
         
         elif method == 'Distance to Nearest':
-            # Calculate distance to nearest feature
-            for i, boundary in boundary_gdf.iterrows():
-                # Get the centroid of the boundary
-                centroid = boundary.geometry.centroid
-                
-                # Calculate distances
-                distances = dataset.geometry.distance(centroid)
-                
-                # Get minimum distance
-                if not distances.empty:
-                    scores.iloc[i] = distances.min()
+            # Use a projected CRS so centroids and distances are in meters
+            if metric_data is not None:
+                local_boundary_gdf, local_dataset = metric_data
+            else:
+                metric_crs = boundary_gdf.estimate_utm_crs()
+                local_boundary_gdf = boundary_gdf.to_crs(metric_crs)
+                local_dataset = dataset.to_crs(metric_crs)
+            
+            # Calculate distance from each boundary centroid to the nearest feature
+            if not local_dataset.empty:
+                centroids = local_boundary_gdf.geometry.centroid
+                boundary_pos, dataset_pos = local_dataset.sindex.nearest(centroids, return_all=False)
+                out = np.zeros(len(boundary_gdf), dtype=np.float64)
+                out[boundary_pos] = shapely.distance(centroids.values[boundary_pos], local_dataset.geometry.values[dataset_pos])
+                scores = pd.Series(out, index=boundary_gdf.index, copy=False)
         
         elif method == 'Percent Coverage':
-            # Calculate percent coverage of boundary
-            for i, boundary in boundary_gdf.iterrows():
-                intersecting = dataset[dataset.intersects(boundary.geometry)]
-                if not intersecting.empty:
-                    # Calculate intersection area
-                    intersection_area = sum(intersecting.geometry.intersection(boundary.geometry).area)
-                    
-                    # Calculate boundary area
-                    boundary_area = boundary.geometry.area
-                    
-                    # Calculate percent coverage
-                    if boundary_area > 0:
-                        percent_coverage = (intersection_area / boundary_area) * 100
-                        scores.iloc[i] = percent_coverage
-        
-        # Add before normalization in _process_criterion
-        print(f"Pre-normalized scores for {criterion.name}: Min={scores.min()}, Max={scores.max()}, Mean={scores.mean()}")
+            # Use a projected CRS for accurate area calculations
+            if metric_data is not None:
+                local_boundary_gdf, local_dataset = metric_data
+            else:
+                metric_crs = boundary_gdf.estimate_utm_crs()
+                local_boundary_gdf = boundary_gdf.to_crs(metric_crs)
+                local_dataset = dataset.to_crs(metric_crs)
+            
+            # Clip the features to each boundary and merge them, so areas where
+            # features overlap each other are only counted once
+            boundary_pos, dataset_pos = self._intersecting_pairs(local_dataset, local_boundary_gdf.geometry)
+            out = np.zeros(len(boundary_gdf), dtype=np.float64)
+            if len(boundary_pos) > 0:
+                clipped = gpd.GeoDataFrame(
+                    {'boundary_pos': boundary_pos},
+                    geometry=self._clipped(local_dataset, dataset_pos, local_boundary_gdf, boundary_pos).values,
+                    crs=local_boundary_gdf.crs
+                )
+                covered_area = clipped.dissolve(by='boundary_pos').area
+                out[covered_area.index.to_numpy()] = covered_area.to_numpy()
+            
+            # Boundaries with no area keep a coverage of 0
+            boundary_area = local_boundary_gdf.geometry.area.to_numpy()
+            np.divide(out, boundary_area, out=out, where=boundary_area > 0)
+            scores = pd.Series(out * 100, index=boundary_gdf.index, copy=False)
         
         # Normalize scores (0 to 1 range) with better handling of zeros and equal values
         if not scores.empty:
-            # Print detailed diagnostics
-            print(f"Raw scores for {criterion.name}: Min={scores.min()}, Max={scores.max()}, Mean={scores.mean()}")
+            # Compute the statistics once and do the arithmetic on the raw array
+            arr = scores.to_numpy(dtype=np.float64)
+            a_min = np.nanmin(arr)
+            a_max = np.nanmax(arr)
+            logger.debug("%s: raw scores min=%s, max=%s, mean=%s", criterion.name, a_min, a_max, np.nanmean(arr))
             
-            if scores.max() != scores.min():
-                # Normal case - different values exist
+            if a_max != a_min:
+                # Normal case - different values exist; inverting for 'Lower is better'
+                # and normalizing to the 0-1 range is a single expression either way
                 if criterion.preference == 'Lower is better':
-                    # Invert the scores (max becomes min, min becomes max)
-                    scores = scores.max() - scores + scores.min()
-                    print(f"After inversion: Min={scores.min()}, Max={scores.max()}, Mean={scores.mean()}")
-                
-                # Normalize to 0-1 range
-                scores = (scores - scores.min()) / (scores.max() - scores.min())
-                print(f"After normalization: Min={scores.min()}, Max={scores.max()}, Mean={scores.mean()}")
+                    arr = (a_max - arr) / (a_max - a_min)
+                else:
+                    arr = (arr - a_min) / (a_max - a_min)
             
-            elif scores.max() == 0 and scores.min() == 0:
+            elif a_max == 0:
                 # All zeros case - likely no intersections found
-                print(f"WARNING: All features have score 0 for {criterion.name}. Check if datasets intersect.")
+                logger.warning("All features have score 0 for %s. Check if datasets intersect.", criterion.name)
                 # Keep zeros to indicate no data
-                scores = pd.Series(0.0, index=scores.index)
+                arr = np.zeros_like(arr)
                 
                 # Add error message to the streamlit app
-                st.warning(f"No features from {criterion.name} dataset intersect with boundary. Check coordinate systems and data.")
+                warnings.append(f"No features from {criterion.name} dataset intersect with boundary. Check coordinate systems and data.")
             
             else:
                 # All values are equal but non-zero
-                print(f"All features have the same score ({scores.mean()}) for {criterion.name}")
-                
-                # For percentages, keep actual values if they're already in a reasonable range
-                if method in ['Percent Coverage'] and 0 <= scores.max() <= 100:
+                if method in ['Percent Coverage'] and 0 <= a_max <= 100:
                     # Convert to 0-1 scale if values are percentages
-                    scores = scores / 100.0
-                    print(f"Percentage values normalized to: {scores.mean()}")
-                elif scores.max() <= 1.0 and scores.min() >= 0.0:
+                    arr = arr / 100.0
+                elif a_max <= 1.0 and a_min >= 0.0:
                     # If values already in 0-1 range, keep them
-                    print(f"Values already in 0-1 range: {scores.mean()}")
+                    pass
                 else:
-                    # Otherwise use the criterion preference
-                    value = 0.5  # Use 0.5 as middle ground for equal values
-                    if criterion.preference == 'Lower is better':
-                        value = 0.0  # Lower is better gets 0
-                    else:
-                        value = 1.0  # Higher is better gets 1
-                    
-                    print(f"Using {value} for all features based on preference")
-                    scores = pd.Series(value, index=scores.index)
+                    # Otherwise use the criterion preference: higher is better gets 1, lower gets 0
+                    value = 0.0 if criterion.preference == 'Lower is better' else 1.0
+                    logger.debug("%s: using %s for all features based on preference", criterion.name, value)
+                    arr = np.full_like(arr, value)
+            
+            # Normalized scores only need float32 precision, at half the memory
+            scores = pd.Series(arr.astype(np.float32), index=scores.index, copy=False)
 
-        return scores
+        return scores, warnings
     
-    def _apply_weighted_sum(self, result_gdf, criterion_results):
+    def _intersecting_pairs(self, dataset, geometries):
         """
-        Apply weighted sum analysis.
+        Find every (boundary, dataset feature) pair that intersects, in one spatial index query.
         
         Args:
-            result_gdf: GeoDataFrame containing boundary features
-            criterion_results: Dictionary of criterion results
+            dataset: GeoDataFrame to search
+            geometries: GeoSeries of boundary geometries
             
         Returns:
-            GeoDataFrame: Result with suitability scores
+            tuple: (boundary positions, dataset positions) as integer arrays
         """
-        # Calculate total weight
-        total_weight = sum(cr['criterion'].weight for cr in criterion_results.values())
+        # Very large joins are partitioned with dask-geopandas when it is installed
+        if dask_geopandas is not None and len(geometries) * len(dataset) > LARGE_JOIN_THRESHOLD:
+            return self._intersecting_pairs_partitioned(dataset, geometries)
         
-        # Initialize suitability score column
-        result_gdf['suitability_score'] = 0.0
+        boundary_pos, dataset_pos = dataset.sindex.query(geometries, predicate='intersects')
+        return boundary_pos, dataset_pos
+    
+    def _intersecting_pairs_partitioned(self, dataset, geometries):
+        """
+        Find intersecting pairs with a partitioned dask-geopandas spatial join.
+        Both inputs are shuffled along a Hilbert curve, so each partition only
+        joins against the partitions whose extents overlap it.
         
-        # Add individual criterion score columns for transparency
-        for criterion_id, data in criterion_results.items():
-            criterion = data['criterion']
-            scores = data['scores']
+        Args:
+            dataset: GeoDataFrame to search
+            geometries: GeoSeries of boundary geometries
+            
+        Returns:
+            tuple: (boundary positions, dataset positions) as integer arrays
+        """
+        npartitions = (os.cpu_count() or 1) * 4
+        left = gpd.GeoDataFrame({'boundary_pos': np.arange(len(geometries))},
+                                geometry=geometries.values, crs=dataset.crs)
+        right = gpd.GeoDataFrame({'dataset_pos': np.arange(len(dataset))},
+                                 geometry=dataset.geometry.values, crs=dataset.crs)
+        left = dask_geopandas.from_geopandas(left, npartitions=npartitions).spatial_shuffle(by='hilbert')
+        right = dask_geopandas.from_geopandas(right, npartitions=npartitions).spatial_shuffle(by='hilbert')
+        
+        pairs = dask_geopandas.sjoin(left, right, predicate='intersects')[['boundary_pos', 'dataset_pos']].compute()
+        
+        # Return the pairs grouped by boundary, like a spatial index query
+        boundary_pos = pairs['boundary_pos'].to_numpy()
+        dataset_pos = pairs['dataset_pos'].to_numpy()
+        order = np.lexsort((dataset_pos, boundary_pos))
+        return boundary_pos[order], dataset_pos[order]
+    
+    def _clipped(self, dataset, dataset_pos, boundary_gdf, boundary_pos):
+        """
+        Clip dataset features to the boundaries they intersect, pair by pair.
+        
+        Args:
+            dataset: GeoDataFrame of features
+            dataset_pos: Positions of features in the dataset
+            boundary_gdf: GeoDataFrame of boundaries
+            boundary_pos: Positions of the matching boundaries
             
-            # Add criterion score column
-            column_name = f"{criterion.name}_score"
-            result_gdf[column_name] = scores
+        Returns:
+            GeoSeries: Intersection geometry for each pair
+        """
+        features = dataset.geometry.iloc[dataset_pos].reset_index(drop=True)
+        boundaries = boundary_gdf.geometry.iloc[boundary_pos].reset_index(drop=True)
+        return features.intersection(boundaries)
+    
+    def _aggregate_by_boundary(self, values, boundary_pos, boundary_gdf, aggregation):
+        """
+        Aggregate per-pair values by boundary. Boundaries without pairs score 0.
+        
+        Args:
+            values: Value for each intersecting pair
+            boundary_pos: Boundary position for each pair
+            boundary_gdf: GeoDataFrame of boundaries
+            aggregation: Pandas aggregation name ('size', 'sum', 'mean', 'min' or 'max')
             
-            # Add to weighted sum
-            if total_weight > 0:
-                # Calculate normalized weight
-                normalized_weight = criterion.weight / total_weight
-                
-                # Apply weight to scores
-                result_gdf['suitability_score'] += scores * normalized_weight
-            else:
-                # If total weight is 0, use equal weights
-                result_gdf['suitability_score'] += scores / len(criterion_results)
+        Returns:
+            pandas.Series: Aggregated value for each boundary feature
+        """
+        aggregated = pd.Series(np.asarray(values)).groupby(boundary_pos).agg(aggregation)
+        out = np.zeros(len(boundary_gdf), dtype=np.float64)
+        out[aggregated.index.to_numpy()] = aggregated.to_numpy(dtype=np.float64)
+        return pd.Series(out, index=boundary_gdf.index, copy=False)
+    
+    def _apply_weighted_sum(self, result_gdf, criterion_results):
+        """
+        Apply weighted sum analysis.
         
-        return result_gdf
+        Args:
+            result_gdf: GeoDataFrame containing boundary features
+            criterion_results: Dictionary of criterion results
+            
+        Returns:
+            GeoDataFrame: Result with suitability scores
+        """
+        criteria = [data['criterion'] for data in criterion_results.values()]
+        
+        # Stack criterion scores into an (features x criteria) matrix
+        score_matrix = self._stack_scores(criterion_results)
+        
+        # Normalize weights; if total weight is 0, use equal weights
+        weights = np.array([c.weight for c in criteria], dtype=np.float32)
+        total_weight = weights.sum()
+        if total_weight > 0:
+            weights = weights / total_weight
+        else:
+            weights = np.full(len(criteria), 1.0 / len(criteria), dtype=np.float32)
+        
+        # Weighted sum of all criteria in a single matrix-vector product
+        result_gdf['suitability_score'] = score_matrix @ weights
+        
+        # Add individual criterion score columns for transparency, in a single assign
+        return result_gdf.assign(**{
+            f"{data['criterion'].name}_score": data['scores']
+            for data in criterion_results.values()
+        })
     
     def _apply_boolean(self, result_gdf, criterion_results):
         """
@@ -324,42 +429,55 @@ class SuitabilityAnalyzer:
         Returns:
             GeoDataFrame: Result with suitability scores
         """
-        # Add individual criterion suitability columns
-        for criterion_id, data in criterion_results.items():
+        # Stack criterion scores and test them against the threshold in one pass
+        suitable_matrix = self._stack_scores(criterion_results) >= self.threshold
+        
+        # Add individual criterion score and boolean suitable columns in a single assign
+        criterion_columns = {}
+        for i, data in enumerate(criterion_results.values()):
             criterion = data['criterion']
-            scores = data['scores']
-            
-            # Add criterion score column
-            column_name = f"{criterion.name}_score"
-            result_gdf[column_name] = scores
-            
-            # Add boolean suitable column
-            suitable_column = f"{criterion.name}_suitable"
-            result_gdf[suitable_column] = scores >= self.threshold
+            criterion_columns[f"{criterion.name}_score"] = data['scores']
+            criterion_columns[f"{criterion.name}_suitable"] = suitable_matrix[:, i]
+        result_gdf = result_gdf.assign(**criterion_columns)
         
-        # Count criteria met
-        criterion_suitable_columns = [f"{data['criterion'].name}_suitable" for data in criterion_results.values()]
-        result_gdf['criteria_met_count'] = result_gdf[criterion_suitable_columns].sum(axis=1)
+        # Count criteria met straight from the boolean matrix
+        criteria_met = np.count_nonzero(suitable_matrix, axis=1)
+        criteria_total = len(criterion_results)
+        result_gdf['criteria_met_count'] = criteria_met
         
         # Apply boolean mode
         if self.boolean_mode == 'all':
             # All criteria must be met
-            result_gdf['is_suitable'] = result_gdf['criteria_met_count'] == len(criterion_results)
+            result_gdf['is_suitable'] = criteria_met == criteria_total
         
         elif self.boolean_mode == 'any':
             # At least one criterion must be met
-            result_gdf['is_suitable'] = result_gdf['criteria_met_count'] > 0
+            result_gdf['is_suitable'] = criteria_met > 0
         
         elif self.boolean_mode == 'majority':
             # Majority of criteria must be met
-            result_gdf['is_suitable'] = result_gdf['criteria_met_count'] > (len(criterion_results) / 2)
+            result_gdf['is_suitable'] = criteria_met > (criteria_total / 2)
         
         elif self.boolean_mode == 'percentage':
             # Percentage of criteria must be met
-            threshold_count = max(1, round(len(criterion_results) * self.threshold))
-            result_gdf['is_suitable'] = result_gdf['criteria_met_count'] >= threshold_count
+            threshold_count = max(1, round(criteria_total * self.threshold))
+            result_gdf['is_suitable'] = criteria_met >= threshold_count
         
         # Set suitability score
-        result_gdf['suitability_score'] = result_gdf['criteria_met_count'] / len(criterion_results)
+        result_gdf['suitability_score'] = criteria_met / criteria_total
+        
+        return result_gdf
+    
+    def _stack_scores(self, criterion_results):
+        """
+        Stack criterion scores column-wise into a single array.
         
-        return result_gdf
\ No newline at end of file
+        Args:
+            criterion_results: Dictionary of criterion results
+            
+        Returns:
+            numpy.ndarray: Array of shape (features, criteria)
+        """
+        return np.column_stack([
+            data['scores'].to_numpy(dtype=np.float32) for data in criterion_results.values()
+        ])
\ No newline at end of file
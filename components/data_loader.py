@@ -1,8 +1,99 @@
 # components/data_loader.py
 import geopandas as gpd
 import os
+import shutil
+import hashlib
+import traceback
 import tempfile
 import streamlit as st
+from shapely.geometry import box
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+def _read_geofile(source, mask=None):
+    """
+    Read a vector file, preferring pyogrio's Arrow reader over geopandas.
+    
+    Args:
+        source: Path, zip:// URI or file-like object
+        mask: Optional GeoSeries; only features intersecting it are read
+        
+    Returns:
+        GeoDataFrame: The loaded dataset
+    """
+    if pyogrio is not None:
+        try:
+            if mask is None:
+                return pyogrio.read_dataframe(source, use_arrow=True)
+            # geopandas reprojects the mask to the file's CRS before handing it to pyogrio
+            return gpd.read_file(source, engine='pyogrio', use_arrow=True, mask=mask)
+        except Exception:
+            # Missing pyarrow or a driver quirk - use the standard reader
+            if hasattr(source, 'seek'):
+                source.seek(0)
+    return gpd.read_file(source, mask=mask)
+
+def uploaded_file_hash(file_obj):
+    """
+    Hash the contents of an uploaded file without copying them.
+    
+    Args:
+        file_obj: Streamlit UploadedFile object
+        
+    Returns:
+        str: Hex digest identifying the file contents
+    """
+    return hashlib.blake2b(file_obj.getbuffer(), digest_size=16).hexdigest()
+
+@st.cache_data(show_spinner=False)
+def _parse_uploaded_geofile(_file_obj, file_hash, file_name, mask_bounds=None):
+    """
+    Parse an uploaded file into a GeoDataFrame.
+    Cached on the file's content hash so Streamlit reruns don't re-read the file.
+    
+    Args:
+        _file_obj: Streamlit UploadedFile object (not hashed)
+        file_hash (str): Result of uploaded_file_hash(_file_obj)
+        file_name (str): Original file name (used to pick the reader)
+        mask_bounds (tuple): Optional ((minx, miny, maxx, maxy), crs) extent to read
+        
+    Returns:
+        tuple: (gdf, dataset_name)
+    """
+    _file_obj.seek(0)
+    
+    # Read only the features within the requested extent; the filter is applied by GDAL
+    mask = None
+    if mask_bounds is not None:
+        bounds, crs = mask_bounds
+        mask = gpd.GeoSeries([box(*bounds)], crs=crs)
+    
+    # Handle different file types
+    if file_name.endswith('.zip'):
+        if pyogrio is not None:
+            # pyogrio opens zipped shapefiles straight from the upload
+            gdf = _read_geofile(_file_obj, mask)
+        else:
+            # Otherwise stream the upload to disk in chunks and read it through GDAL's zip:// handler
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = os.path.join(tmp_dir, file_name)
+                with open(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(_file_obj, f, length=1 << 20)
+                gdf = _read_geofile(f"zip://{tmp_path}", mask)
+        dataset_name = file_name.replace('.zip', '')
+        
+    elif file_name.endswith('.geojson') or file_name.endswith('.json'):
+        # GeoJSON can be parsed straight from memory
+        gdf = _read_geofile(_file_obj, mask)
+        dataset_name = file_name.replace('.geojson', '').replace('.json', '')
+        
+    else:
+        raise ValueError(f"Unsupported file type: {file_name}")
+    
+    return gdf, dataset_name
 
 class DataLoader:
     """
@@ -13,62 +104,51 @@ class DataLoader:
         """Initialize the data loader."""
         self.temp_directories = []  # Track temp directories to clean up later
     
-    # In data_loader.py, modify the load_dataset method:
-
-    def load_dataset(self, file_obj):
+    def load_dataset(self, file_obj, mask=None):
         """
         Load a dataset with improved handling for complex files.
+        
+        Args:
+            file_obj: Streamlit UploadedFile object
+            mask: Optional GeoDataFrame or GeoSeries; only features within its extent are loaded
+            
+        Returns:
+            tuple: (gdf, dataset_name), or (None, None) if loading failed
         """
         # Get the file name
         file_name = file_obj.name
-        tmp_path = None
+        
+        # Pass the mask as its extent and CRS, which are cheap to hash for the cache.
+        # The extent is padded by 1% so features that only touch its edge survive
+        # being reprojected to the file's CRS
+        mask_bounds = None
+        if mask is not None:
+            minx, miny, maxx, maxy = mask.total_bounds
+            pad_x, pad_y = (maxx - minx) * 0.01, (maxy - miny) * 0.01
+            mask_bounds = ((minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y), mask.crs.to_string())
         
         try:
-            # Make a temporary directory
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                # Save the file to the temp directory
-                tmp_path = os.path.join(tmp_dir, file_name)
-                with open(tmp_path, 'wb') as f:
-                    f.write(file_obj.getvalue())
-                
-                st.info(f"Loading {file_name}...")
-                
-                # Handle different file types
-                if file_name.endswith('.zip'):
-                    # For zipped shapefiles, don't specify the driver explicitly
-                    gdf = gpd.read_file(f"zip://{tmp_path}")
-                    dataset_name = file_name.replace('.zip', '')
-                    
-                elif file_name.endswith('.geojson') or file_name.endswith('.json'):
-                    gdf = gpd.read_file(tmp_path)
-                    dataset_name = file_name.replace('.geojson', '').replace('.json', '')
-                    
-                else:
-                    raise ValueError(f"Unsupported file type: {file_name}")
-                
-                # Check if we have valid data
-                if gdf is None or len(gdf) == 0:
-                    st.warning("The dataset appears to be empty.")
-                    return None, None
-                    
-                # Print some information about the dataset to help with debugging
-                st.write(f"Dataset loaded with {len(gdf)} features")
-                st.write(f"Geometry types: {gdf.geometry.type.unique().tolist()}")
+            st.info(f"Loading {file_name}...")
+            
+            # st.cache_data hands back a fresh copy on every hit, so the
+            # caller is free to modify the returned GeoDataFrame
+            gdf, dataset_name = _parse_uploaded_geofile(file_obj, uploaded_file_hash(file_obj), file_name, mask_bounds)
+            
+            # Check if we have valid data
+            if gdf is None or len(gdf) == 0:
+                st.warning("The dataset appears to be empty.")
+                return None, None
                 
-                return gdf, dataset_name
+            # Print some information about the dataset to help with debugging
+            st.write(f"Dataset loaded with {len(gdf)} features")
+            st.write(f"Geometry types: {gdf.geometry.type.unique().tolist()}")
+            
+            return gdf, dataset_name
                 
         except Exception as e:
             st.error(f"Error loading dataset: {str(e)}")
-            import traceback
             st.write(traceback.format_exc())
             return None, None
-        finally:
-            # Clean up the temporary file
-            if tmp_path:
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
                 
     def load_boundary(self, uploaded_file):
         """
@@ -87,8 +167,7 @@ class DataLoader:
         """Remove temporary directories."""
         for temp_dir in self.temp_directories:
             try:
-                import shutil
                 shutil.rmtree(temp_dir)
             except Exception:
                 pass
-        self.temp_directories = []
\ No newline at end of file
+        self.temp_directories = []
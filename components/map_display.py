@@ -1,10 +1,51 @@
 # components/map_display.py
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 import geopandas as gpd
-import json
+import numpy as np
+import shapely
 import branca.colormap as cm
+from utils.map_utils import gdf_content_hash
+from utils.file_utils import WGS84
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _gdf_to_geojson_str(_gdf, content_hash, crs, simplify_tolerance=None):
+    """
+    Convert a GeoDataFrame to a WGS84 GeoJSON string for display, cached on its contents.
+    Kept as a string so the layer stays one compact buffer in session state.
+    
+    Args:
+        _gdf: GeoDataFrame to convert (not hashed)
+        content_hash (str): Result of gdf_content_hash(_gdf)
+        crs (str): CRS of _gdf, part of the cache key since the hash ignores it
+        simplify_tolerance: Simplification tolerance in degrees, 'auto' to derive one
+            from the extent, or None to keep full resolution
+        
+    Returns:
+        tuple: (GeoJSON FeatureCollection string, total bounds in EPSG:4326)
+    """
+    # Convert to WGS84 if needed
+    gdf = _gdf
+    if gdf.crs and not WGS84.equals(gdf.crs, ignore_axis_order=True):
+        gdf = gdf.to_crs(WGS84)
+    
+    # Clean up any timestamp columns
+    gdf_to_display = gdf.copy(deep=False)
+    datetime_cols = gdf_to_display.select_dtypes(include=['datetime', 'datetimetz']).columns
+    gdf_to_display[datetime_cols] = gdf_to_display[datetime_cols].astype(str)
+    
+    # Simplify polygons and lines; 1/4000 of the extent is finer than a screen pixel at the fitted zoom
+    if simplify_tolerance == 'auto':
+        minx, miny, maxx, maxy = gdf.total_bounds
+        simplify_tolerance = max(maxx - minx, maxy - miny) / 4000
+    if simplify_tolerance and not (gdf_to_display.geom_type == 'Point').all():
+        gdf_to_display['geometry'] = shapely.simplify(gdf_to_display.geometry.values, simplify_tolerance, preserve_topology=True)
+    
+    # Columns with no values would only add a null to every feature
+    gdf_to_display = gdf_to_display.dropna(axis=1, how='all')
+    
+    return gdf_to_display.to_json(na='null', show_bbox=False), gdf.total_bounds
 
 class MapDisplay:
     """
@@ -33,6 +74,24 @@ class MapDisplay:
     
     def display(self):
         """Display the map in the Streamlit app."""
+        # Reuse the rendered map while the layers and view are unchanged; folium
+        # walks every feature to build the page, so only do that when needed
+        render_key = (
+            tuple((name, info['content_hash'], str(info.get('style')), info.get('simplify_tolerance'))
+                  for name, info in st.session_state.map_layers.items()),
+            tuple(st.session_state.map_center),
+            st.session_state.map_zoom
+        )
+        rendered = st.session_state.get('map_html')
+        if rendered is None or rendered[0] != render_key:
+            rendered = (render_key, self._render_map())
+            st.session_state.map_html = rendered
+        
+        # Display the map
+        components.html(rendered[1], width=700, height=510)
+    
+    def _render_map(self):
+        """Build the folium map from the stored layers and render it to HTML."""
         # Create a base map
         m = folium.Map(
             location=st.session_state.map_center,
@@ -69,8 +128,7 @@ class MapDisplay:
                     style_function=layer_info['style_function']
                 ).add_to(m)
         
-        # Display the map
-        folium_static(m)
+        return folium.Figure().add_child(m).render()
     
     def add_dataset_layer(self, gdf, name, style=None):
         """
@@ -84,17 +142,9 @@ class MapDisplay:
         if gdf is None or len(gdf) == 0:
             return
         
-        # Convert to WGS84 if needed
-        if gdf.crs and str(gdf.crs) != "EPSG:4326":
-            gdf = gdf.to_crs(epsg=4326)
-        
-        # Clean up any timestamp columns
-        gdf_to_display = gdf.copy()
-        for col in gdf_to_display.columns:
-            if col != 'geometry':
-                dtype_str = str(gdf_to_display[col].dtype).lower()
-                if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                    gdf_to_display[col] = gdf_to_display[col].astype(str)
+        # Convert to GeoJSON once per dataset; reruns reuse the cached string
+        content_hash = gdf_content_hash(gdf)
+        geojson_data, bounds = _gdf_to_geojson_str(gdf, content_hash, str(gdf.crs))
         
         # Default style if none provided
         if style is None:
@@ -105,18 +155,15 @@ class MapDisplay:
                 'fillOpacity': 0.2
             }
         
-        # Convert to GeoJSON
-        geojson_data = json.loads(gdf_to_display.to_json())
-        
         # Store layer info in session state
         st.session_state.map_layers[name] = {
             'type': 'geojson',
             'geojson_data': geojson_data,
+            'content_hash': content_hash,
             'style': style
         }
         
         # Update map center
-        bounds = gdf.total_bounds
         st.session_state.map_center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
     
     def remove_dataset_layer(self, name):
@@ -129,7 +176,7 @@ class MapDisplay:
         if name in st.session_state.map_layers:
             del st.session_state.map_layers[name]
     
-    def display_results(self, result_gdf, value_column='suitability_score', title=None):
+    def display_results(self, result_gdf, value_column='suitability_score', title=None, simplify_tolerance='auto'):
         """
         Display analysis results on the map.
         
@@ -137,44 +184,34 @@ class MapDisplay:
             result_gdf (GeoDataFrame): Results GeoDataFrame
             value_column (str): Column to use for coloring
             title (str, optional): Title for the layer
+            simplify_tolerance: Geometry simplification tolerance in degrees; 'auto' derives
+                one from the extent, None displays full resolution
         """
         if result_gdf is None or len(result_gdf) == 0:
             return
         
-        # Convert to WGS84 if needed
-        if result_gdf.crs and str(result_gdf.crs) != "EPSG:4326":
-            result_gdf = result_gdf.to_crs(epsg=4326)
-        
-        # Clean up any timestamp columns
-        gdf_to_display = result_gdf.copy()
-        for col in gdf_to_display.columns:
-            if col != 'geometry':
-                dtype_str = str(gdf_to_display[col].dtype).lower()
-                if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                    gdf_to_display[col] = gdf_to_display[col].astype(str)
-        
         # Create color map
         min_val = result_gdf[value_column].min()
         max_val = result_gdf[value_column].max()
         colors = ['red', 'yellow', 'green']
         
-        # Create style function
+        # Pick every feature's fill color in one vectorized pass and carry it as a property
+        if min_val == max_val:
+            normalized = np.ones(len(result_gdf))
+        else:
+            normalized = (result_gdf[value_column].to_numpy(dtype=float) - min_val) / (max_val - min_val)
+        fill_colors = np.select([normalized < 0.33, normalized < 0.66], ['#ff0000', '#ffff00'], default='#00ff00')
+        gdf_to_display = result_gdf.assign(_color=fill_colors)
+        
+        # Convert to GeoJSON once per result; reruns reuse the cached string
+        content_hash = gdf_content_hash(gdf_to_display)
+        geojson_data, bounds = _gdf_to_geojson_str(gdf_to_display, content_hash, str(gdf_to_display.crs),
+                                                    simplify_tolerance)
+        
+        # Create style function; the color is already on the feature, so this is just a lookup
         def style_function(feature):
-            # Safe access to properties
-            props = feature.get('properties', {})
-            value = props.get(value_column, min_val)
-            
-            # Calculate color (simple linear interpolation)
-            if min_val == max_val:
-                normalized = 1.0
-            else:
-                normalized = (value - min_val) / (max_val - min_val)
-            
-            # Use green for highest values
-            color = '#ff0000' if normalized < 0.33 else '#ffff00' if normalized < 0.66 else '#00ff00'
-            
             return {
-                'fillColor': color,
+                'fillColor': feature['properties']['_color'],
                 'color': 'black',
                 'weight': 1,
                 'fillOpacity': 0.7
@@ -186,7 +223,9 @@ class MapDisplay:
         # Store as choropleth in session state
         st.session_state.map_layers[layer_name] = {
             'type': 'choropleth',
-            'geojson_data': json.loads(gdf_to_display.to_json()),
+            'geojson_data': geojson_data,
+            'content_hash': content_hash,
+            'simplify_tolerance': simplify_tolerance,
             'style_function': style_function,
             'colors': colors,
             'vmin': min_val,
@@ -195,5 +234,4 @@ class MapDisplay:
         }
         
         # Update map center
-        bounds = result_gdf.total_bounds
         st.session_state.map_center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
\ No newline at end of file
@@ -1,9 +1,17 @@
 # components/results_export.py
 import tempfile
 import os
-import json
+import io
 import zipfile
+import shutil
 import streamlit as st
+import pandas as pd
+import numpy as np
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
 
 class ResultsExporter:
     """
@@ -11,24 +19,42 @@ class ResultsExporter:
     """
     
     def export_geojson(self, result_gdf, filename_base):
-        with tempfile.NamedTemporaryFile(suffix='.geojson', delete=False) as tmp:
-            # Close the file handle before writing to it with geopandas
-            tmp_name = tmp.name
+        """
+        Export results as a GeoJSON dict, built in memory without going through a file.
         
-        # Now write to it with the file handle closed
-        result_gdf.to_file(tmp_name, driver='GeoJSON')
+        Args:
+            result_gdf (GeoDataFrame): Analysis results
+            filename_base (str): Base filename, used as the collection name
+            
+        Returns:
+            dict: GeoJSON FeatureCollection
+        """
+        gdf = result_gdf.copy(deep=False)
         
-        # Read the file contents
-        with open(tmp_name, 'r') as f:
-            geojson_data = json.load(f)
+        # Write timestamps as ISO strings, as the GeoJSON driver did
+        for col in gdf.select_dtypes(include=['datetime', 'datetimetz']).columns:
+            gdf[col] = gdf[col].map(lambda x: x.isoformat() if pd.notna(x) else None)
         
-        # Delete the temporary file after reading
-        try:
-            os.remove(tmp_name)
-        except:
-            pass  # If we can't delete it now, it will be cleaned up later
-            
-        return geojson_data
+        # Keep float32 scores at their shortest repr (0.7, not 0.699999988079071)
+        float32_cols = gdf.select_dtypes(include=['float32']).columns
+        gdf[float32_cols] = gdf[float32_cols].astype(str).astype(np.float64)
+        
+        # Leave out null properties instead of writing "key": null into every feature
+        geojson_data = gdf.to_geo_dict(na='drop', show_bbox=False, drop_id=True)
+        
+        # Name the collection and record its CRS the same way GDAL's GeoJSON driver does
+        crs_name = None
+        if gdf.crs is not None:
+            epsg = gdf.crs.to_epsg()
+            if epsg == 4326:
+                crs_name = 'urn:ogc:def:crs:OGC:1.3:CRS84'
+            elif epsg is not None:
+                crs_name = f'urn:ogc:def:crs:EPSG::{epsg}'
+        header = {'type': 'FeatureCollection', 'name': filename_base}
+        if crs_name:
+            header['crs'] = {'type': 'name', 'properties': {'name': crs_name}}
+        
+        return {**header, 'features': geojson_data['features']}
     
     def export_shapefile(self, result_gdf, filename):
         """
@@ -39,7 +65,7 @@ class ResultsExporter:
             filename (str): Base filename without extension
             
         Returns:
-            bytes: Data for Streamlit download button
+            tuple: (ZIP data as bytes, download file name)
         """
         if not filename.endswith('.shp'):
             filename += '.shp'
@@ -48,30 +74,24 @@ class ResultsExporter:
         temp_dir = tempfile.mkdtemp()
         shp_base = os.path.join(temp_dir, 'temp_shapefile')
         
-        # Export to Shapefile
-        result_gdf.to_file(shp_base + '.shp', driver='ESRI Shapefile')
+        # Export to Shapefile; pyogrio writes whole columns at once instead of record by record
+        engine = 'pyogrio' if pyogrio is not None else None
+        result_gdf.to_file(shp_base + '.shp', driver='ESRI Shapefile', engine=engine)
         
-        # Create a temporary ZIP file
+        # Build the ZIP in memory, since the download button needs its bytes anyway;
+        # level 1 compresses the DBF several times faster than the default level at
+        # a small cost in size
         zip_filename = filename.replace('.shp', '.zip')
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp:
-            # Create the ZIP file
-            with zipfile.ZipFile(tmp.name, 'w') as zipf:
+        zip_buffer = io.BytesIO()
+        try:
+            with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
                 for f in os.listdir(temp_dir):
                     zipf.write(os.path.join(temp_dir, f), arcname=f)
-            
-            # Read the file for download
-            with open(tmp.name, 'rb') as f:
-                data = f.read()
-            
-            # Clean up
-            try:
-                os.unlink(tmp.name)
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+        finally:
+            # Clean up the shapefile components
+            shutil.rmtree(temp_dir, ignore_errors=True)
         
-        return data, zip_filename
+        return zip_buffer.getvalue(), zip_filename
     
     def export_csv(self, result_gdf, filename):
         """
@@ -1,76 +1,181 @@
 # models/project.py
+import os
+import shutil
+import tempfile
+import traceback
+import weakref
 import streamlit as st
 import geopandas as gpd
+from pandas.api.types import infer_dtype
+from utils.file_utils import find_name_field, find_id_field, generate_unique_id, geojson_dumps
+from models.criterion import Criterion
+
+# infer_dtype kinds of object columns that can be stored as they are
+JSON_SAFE_KINDS = ('string', 'integer', 'floating', 'mixed-integer-float', 'boolean', 'empty')
+
+@st.cache_resource(show_spinner=False, max_entries=16, ttl=3600)
+def load_persisted_dataset(path):
+    """
+    Load a dataset persisted by Project from its GeoParquet file.
+    Cached as a shared resource so recently used files are only read once per server;
+    evicted entries are simply read again.
+    
+    Args:
+        path (str): Path to the GeoParquet file
+        
+    Returns:
+        GeoDataFrame: The stored dataset
+    """
+    return gpd.read_parquet(path)
+
+@st.cache_resource(show_spinner=False, max_entries=8, ttl=3600)
+def load_persisted_dataset_in_crs(path, crs):
+    """
+    Load a persisted dataset reprojected to another CRS.
+    Cached so each dataset is only reprojected once per target CRS.
+    
+    Args:
+        path (str): Path to the GeoParquet file
+        crs (str): Target CRS, e.g. "EPSG:32615"
+        
+    Returns:
+        GeoDataFrame: The stored dataset in the target CRS
+    """
+    dataset = load_persisted_dataset(path).to_crs(crs)
+    # Build the spatial index here so the cached copy is ready to query
+    dataset.sindex
+    return dataset
 
 class Project:
     """
     Class representing a suitability analysis project.
     """
     
-    def __init__(self):
-        self.title = "Suitability Analysis Project"
-        self.description = "Find the most suitable areas based on your criteria and datasets."
-        self.datasets = {}  # Dictionary to store datasets
-        self.criteria = []  # List to store criteria
+    def __init__(self, title="Suitability Analysis Project",
+                 description="Find the most suitable areas based on your criteria and datasets."):
+        self.title = title
+        self.description = description
+        self.datasets = {}  # Registry of persisted datasets: name -> {'path', 'n', 'columns', 'clipped', 'boundary_key'}
+        self.criteria = {}  # Criteria by id, in the order they were added
         self.boundary_dataset = None
+        self.boundary_dataset_name = None
+        self.boundary_metric = None  # Boundary in a local metric CRS for measurements
+        self.boundary_bounds = None  # Boundary extent in EPSG:4326, as (minx, miny, maxx, maxy)
+        self.boundary_center = None  # Boundary extent center as [lat, lon]
         self.result = None
+        self.result_meta = {}  # Display fields detected once per result
+        self.storage_dir = None  # Created on first dataset write
+        self._storage_cleanup = None  # Removes storage_dir once the project is gone
+        
+    def _persist(self, gdf, name):
+        """
+        Write a dataset to GeoParquet and return its registry entry.
+        
+        Args:
+            gdf (GeoDataFrame): Dataset to store
+            name (str): Dataset name
+            
+        Returns:
+            dict: Registry entry with the file path, feature count and attribute columns
+        """
+        if self.storage_dir is None:
+            self.storage_dir = tempfile.mkdtemp(prefix='suitable_')
+            self._storage_cleanup = weakref.finalize(self, shutil.rmtree, self.storage_dir, ignore_errors=True)
+        
+        # A dataset stored again under the same name replaces its old file
+        old_entry = self.datasets.get(name)
+        if old_entry is not None:
+            try:
+                os.remove(old_entry['path'])
+            except OSError:
+                pass
+        
+        # Every write gets a new file name, since the loaders are cached by path
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name)
+        path = os.path.join(self.storage_dir, f"{safe_name}_{generate_unique_id()}.parquet")
+        gdf.to_parquet(path)
+        
+        return {
+            'path': path,
+            'n': len(gdf),
+            'columns': tuple(c for c in gdf.columns if c != 'geometry')
+        }
         
     def set_boundary(self, dataset, name):
         """Set the boundary dataset."""
         self.boundary_dataset = dataset
         self.boundary_dataset_name = name
-        self.datasets[name] = dataset
+        self.datasets[name] = self._persist(dataset, name)
+        
+        # Build the spatial index now, for criteria that use the boundary as their dataset
+        load_persisted_dataset(self.datasets[name]['path']).sindex
+        
+        # Project once to the local UTM zone so analysis doesn't reproject per criterion
+        self.boundary_metric = dataset.to_crs(dataset.estimate_utm_crs())
+        
+        # Compute the map extent once; the map reads it on every rerun
+        geographic = dataset if dataset.crs is None or dataset.crs.to_epsg() == 4326 else dataset.to_crs(epsg=4326)
+        self.boundary_bounds = tuple(geographic.total_bounds)
+        minx, miny, maxx, maxy = self.boundary_bounds
+        self.boundary_center = [(miny + maxy) / 2, (minx + maxx) / 2]
         
     def add_criterion(self, criterion):
         """Add a criterion to the project."""
-        self.criteria.append(criterion)
+        self.criteria[criterion.id] = criterion
         
     def remove_criterion(self, criterion_id):
         """Remove a criterion from the project."""
-        self.criteria = [c for c in self.criteria if c.id != criterion_id]
+        self.criteria.pop(criterion_id, None)
         
     def set_result(self, result):
-        """Set the analysis result."""
+        """Set the analysis result and detect its display fields once."""
         self.result = result
         
-    def add_dataset(self, name, gdf):
-        """Add a dataset to the project with robust handling for complex datasets"""
+        name_field = find_name_field(result)
+        columns = result.columns
+        score_mask = columns.str.endswith('_score') & (columns != 'suitability_score')
+        
+        self.result_meta = {
+            'name_field': name_field,
+            'id_field': find_id_field(result) if not name_field else None,
+            'score_columns': columns[score_mask].tolist(),
+            'result_id': generate_unique_id()
+        }
+        
+    def add_dataset(self, name, gdf, clipped=False, boundary_key=None):
+        """Add a dataset to the project with robust handling for complex datasets.
+        Set clipped when only the features within the boundary extent were loaded,
+        and boundary_key to identify the boundary they were clipped to."""
         try:
-            # Make a copy to avoid modifying the original
-            gdf_copy = gdf.copy()
+            # Make a shallow copy to avoid modifying the original; with copy-on-write
+            # only the columns converted below are actually copied
+            gdf_copy = gdf.copy(deep=False)
+            
+            # Convert timestamps to strings
+            datetime_cols = gdf_copy.select_dtypes(include=['datetime', 'datetimetz']).columns
+            gdf_copy[datetime_cols] = gdf_copy[datetime_cols].astype(str)
             
-            # Handle problematic data types
-            for col in gdf_copy.columns:
-                if col != 'geometry':
+            # Handle object columns that might contain complex data
+            for col in gdf_copy.select_dtypes(include=['object']).columns:
+                try:
+                    # Convert to strings unless every value is a plain JSON-friendly scalar
+                    if infer_dtype(gdf_copy[col], skipna=True) not in JSON_SAFE_KINDS:
+                        gdf_copy[col] = gdf_copy[col].apply(lambda x: str(x) if x is not None else None)
+                except Exception as col_err:
+                    # If column processing fails, convert the entire column to strings
                     try:
-                        # Handle different data types that might cause issues
-                        dtype_str = str(gdf_copy[col].dtype).lower()
-                        
-                        # Convert timestamps to strings
-                        if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                            gdf_copy[col] = gdf_copy[col].astype(str)
-                        
-                        # Handle object columns that might contain complex data
-                        elif 'object' in dtype_str:
-                            # Test if the column is JSON serializable
-                            import json
-                            try:
-                                # Test with first non-null value
-                                test_val = gdf_copy[col].dropna().iloc[0] if not gdf_copy[col].isna().all() else None
-                                json.dumps({"test": test_val})
-                            except:
-                                # Convert to strings if not serializable
-                                gdf_copy[col] = gdf_copy[col].apply(lambda x: str(x) if x is not None else None)
-                    except Exception as col_err:
-                        # If column processing fails, convert the entire column to strings
-                        try:
-                            gdf_copy[col] = gdf_copy[col].astype(str)
-                        except:
-                            # If that fails too, drop the problematic column
-                            gdf_copy = gdf_copy.drop(columns=[col])
+                        gdf_copy[col] = gdf_copy[col].astype(str)
+                    except:
+                        # If that fails too, drop the problematic column
+                        gdf_copy = gdf_copy.drop(columns=[col])
             
-            # Store in the datasets dictionary
-            self.datasets[name] = gdf_copy
+            # Persist to disk and keep only the registry entry in memory
+            self.datasets[name] = self._persist(gdf_copy, name)
+            self.datasets[name]['clipped'] = clipped
+            self.datasets[name]['boundary_key'] = boundary_key if clipped else None
+            
+            # Build the spatial index now, on the cached copy the analysis will use
+            load_persisted_dataset(self.datasets[name]['path']).sindex
             
             # For debugging, print confirmation
             print(f"Successfully added dataset '{name}' with {len(gdf_copy)} features to project")
@@ -79,13 +184,35 @@ class Project:
             return True
         except Exception as e:
             print(f"Error adding dataset: {str(e)}")
-            import traceback
             print(traceback.format_exc())
             return False
 
-    def get_dataset(self, name):
-        """Get a dataset by name."""
-        return self.datasets.get(name)
+    def get_dataset(self, name, crs=None):
+        """Get a dataset by name, loading it from its persisted file (reprojected to crs if given)."""
+        entry = self.datasets.get(name)
+        if entry is None:
+            return None
+        dataset = load_persisted_dataset(entry['path'])
+        if crs is not None and dataset.crs != crs:
+            dataset = load_persisted_dataset_in_crs(entry['path'], crs.to_string())
+        return dataset
+    
+    def get_metric_dataset(self, name):
+        """Get a dataset by name, reprojected to the boundary's metric CRS."""
+        entry = self.datasets.get(name)
+        if entry is None or self.boundary_metric is None:
+            return None
+        return load_persisted_dataset_in_crs(entry['path'], self.boundary_metric.crs.to_string())
+    
+    def clipped_to_other_boundary(self, name, boundary_key):
+        """Check whether a dataset was clipped to the extent of a boundary other than boundary_key."""
+        entry = self.datasets.get(name)
+        return bool(entry and entry.get('clipped') and entry.get('boundary_key') != boundary_key)
+    
+    def get_dataset_columns(self, name):
+        """Get the attribute (non-geometry) columns of a dataset without loading it."""
+        entry = self.datasets.get(name)
+        return entry['columns'] if entry else ()
     
     def display_summary(self):
         """Display a project summary in Streamlit."""
@@ -106,8 +233,8 @@ class Project:
         # Display all datasets
         if self.datasets:
             st.write("**Available Datasets:**")
-            for name, dataset in self.datasets.items():
-                st.write(f"- {name}: {len(dataset)} features")
+            for name, entry in self.datasets.items():
+                st.write(f"- {name}: {entry['n']} features")
                 
     def to_dict(self):
         """Convert the project to a dictionary."""
@@ -115,13 +242,13 @@ class Project:
             'title': self.title,
             'description': self.description,
             'boundary_dataset_name': self.boundary_dataset_name,
-            'criteria': [c.to_dict() for c in self.criteria]
+            'criteria': [c.to_dict() for c in self.criteria.values()]
         }
     
     def to_geojson(self):
         """Export the project boundary as GeoJSON."""
         if self.boundary_dataset is not None:
-            return self.boundary_dataset.to_json()
+            return geojson_dumps(self.boundary_dataset.to_geo_dict(na='null', show_bbox=False))
         return None
     
     @classmethod
@@ -134,7 +261,9 @@ class Project:
         
         # Add datasets if provided
         if datasets:
-            project.datasets = datasets
+            for name, gdf in datasets.items():
+                if name != data['boundary_dataset_name']:
+                    project.add_dataset(name, gdf)
             if data['boundary_dataset_name'] in datasets:
                 project.set_boundary(
                     datasets[data['boundary_dataset_name']],
@@ -142,7 +271,6 @@ class Project:
                 )
         
         # Add criteria
-        from models.criterion import Criterion
         for criterion_data in data.get('criteria', []):
             project.add_criterion(Criterion.from_dict(criterion_data))
             
@@ -156,14 +284,33 @@ class Project:
         """
         if 'project' in session_state:
             old_project = session_state.project
+            
+            # A current Project can be used as it is
+            if isinstance(old_project, cls):
+                return old_project
+            
+            # Otherwise it was created by an earlier version of this class (e.g. before
+            # a code reload), so copy its state into a fresh instance
             project = cls(
                 title=old_project.title,
                 description=old_project.description
             )
             project.boundary_dataset = old_project.boundary_dataset
             project.boundary_dataset_name = old_project.boundary_dataset_name
+            project.boundary_metric = old_project.boundary_metric
+            project.boundary_bounds = getattr(old_project, 'boundary_bounds', None)
+            project.boundary_center = getattr(old_project, 'boundary_center', None)
             project.criteria = old_project.criteria
+            if isinstance(project.criteria, list):
+                # Projects from before criteria were keyed by id
+                project.criteria = {c.id: c for c in project.criteria}
             project.result = old_project.result
+            project.result_meta = old_project.result_meta
             project.datasets = old_project.datasets
+            project.storage_dir = old_project.storage_dir
+            # Hand the storage directory cleanup over to the new instance
+            old_cleanup = getattr(old_project, '_storage_cleanup', None)
+            if old_cleanup is not None and old_cleanup.detach() is not None:
+                project._storage_cleanup = weakref.finalize(project, shutil.rmtree, project.storage_dir, ignore_errors=True)
             return project
         return cls()  # Return a new project if none exists
\ No newline at end of file
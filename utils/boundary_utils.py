@@ -1,6 +1,7 @@
 # utils/boundary_utils.py
 import streamlit as st
 from utils.file_utils import ensure_valid_geodataframe
+from utils.map_utils import gdf_geometry_hash
 
 def process_boundary_upload(boundary_file):
     """
@@ -24,8 +25,7 @@ def process_boundary_upload(boundary_file):
         st.session_state.has_boundary = True
         
         # Set a flag to force the map to zoom to the boundary
-        bounds = valid_gdf.total_bounds
-        st.session_state.map_center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
+        st.session_state.map_center = st.session_state.project.boundary_center
         
         # Important: Force map refresh
         st.session_state.force_map_refresh = True
@@ -38,8 +38,9 @@ def process_boundary_upload(boundary_file):
         if 'last_boundary_key' not in st.session_state:
             st.session_state.last_boundary_key = None
         
-        # Use a more reliable boundary identification that persists across reruns
-        st.session_state.last_boundary_key = f"{id(valid_gdf)}_{dataset_name}"
+        # Identify the boundary by its geometry, which stays stable across reruns
+        # (an object id can be reused once the frame is garbage collected)
+        st.session_state.last_boundary_key = f"{gdf_geometry_hash(valid_gdf)}_{dataset_name}"
         
         st.success(f"Boundary dataset '{dataset_name}' loaded successfully!")
         return True
@@ -1,50 +1,132 @@
 # utils/file_utils.py
-import uuid
+import secrets
 import tempfile
 import os
 import zipfile
+import io
+import hashlib
 import streamlit as st
-import json
+import pandas as pd
 import geopandas as gpd
+import shapely
+import pyproj
 import random
+import json
+import logging
+import functools
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Geographic CRS used for display and export; compare with WGS84.equals(crs)
+# so equivalent definitions (e.g. from WKT) aren't reprojected again
+WGS84 = pyproj.CRS.from_epsg(4326)
+
+def geojson_dumps(obj):
+    """
+    Serialize a GeoJSON dict to a string, using orjson when it is installed.
+    
+    Args:
+        obj (dict): GeoJSON object
+        
+    Returns:
+        str: Compact JSON text
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(',', ':'))
 
 def generate_unique_id():
-    """Generate a unique ID for datasets or criteria."""
-    return str(uuid.uuid4())[:8]
+    """Generate a unique ID for datasets or criteria (8 random hex characters)."""
+    return secrets.token_hex(4)
 
-def extract_shapefile(uploaded_file):
+# Shapefile components worth extracting from an uploaded archive
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+@st.cache_data(show_spinner=False)
+def _extract_shapefile_cached(_uploaded_file, file_hash, file_name):
     """
-    Extract a shapefile from an uploaded ZIP file.
+    Extract an uploaded shapefile ZIP, cached on the upload's content hash.
     
     Args:
-        uploaded_file: Streamlit UploadedFile object
+        _uploaded_file: Streamlit UploadedFile object (not hashed)
+        file_hash (str): Digest of the upload's contents
+        file_name (str): Original file name
         
     Returns:
-        str: Path to the extracted shapefile
+        tuple: (path to the extracted shapefile, temporary directory)
     """
     # Create a temporary directory
     temp_dir = tempfile.mkdtemp()
     
-    # Save the zip file
-    zip_path = os.path.join(temp_dir, uploaded_file.name)
-    with open(zip_path, 'wb') as f:
-        f.write(uploaded_file.getbuffer())
-    
-    # Extract the zip file
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
+    # Extract straight from the upload's buffer, skipping anything that isn't part of a shapefile
+    with zipfile.ZipFile(io.BytesIO(_uploaded_file.getbuffer()), 'r') as zip_ref:
+        for name in zip_ref.namelist():
+            if name.lower().endswith(SHAPEFILE_EXTENSIONS):
+                zip_ref.extract(name, temp_dir)
     
-    # Find all .shp files in the extracted directory
-    shp_files = [f for f in os.listdir(temp_dir) if f.endswith('.shp')]
+    # Find all .shp files in the extracted directory; the entries carry their full
+    # path and file type from the directory read itself
+    with os.scandir(temp_dir) as entries:
+        shp_files = [entry.path for entry in entries if entry.name.endswith('.shp') and entry.is_file()]
     
     if not shp_files:
         raise ValueError("No shapefile found in the zip archive")
     
     # Return the path to the first shapefile
-    return os.path.join(temp_dir, shp_files[0]), temp_dir
+    return shp_files[0], temp_dir
+
+def extract_shapefile(uploaded_file):
+    """
+    Extract a shapefile from an uploaded ZIP file.
+    Identical uploads reuse the earlier extraction instead of unzipping again.
+    
+    Args:
+        uploaded_file: Streamlit UploadedFile object
+        
+    Returns:
+        tuple: (path to the extracted shapefile, temporary directory)
+    """
+    file_hash = hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+    shp_path, temp_dir = _extract_shapefile_cached(uploaded_file, file_hash, uploaded_file.name)
+    
+    # The directory may have been cleaned up since it was cached
+    if not os.path.exists(shp_path):
+        _extract_shapefile_cached.clear()
+        shp_path, temp_dir = _extract_shapefile_cached(uploaded_file, file_hash, uploaded_file.name)
+    
+    return shp_path, temp_dir
 
 # Update the get_random_color function in file_utils.py
 
+# Vibrant colors that are easy to see, for point datasets
+_VIBRANT_COLORS = (
+    '#FF5733',  # Bright orange/red
+    '#33A8FF',  # Bright blue
+    '#47D147',  # Bright green
+    '#D147D1',  # Bright purple
+    '#FFD700',  # Gold
+    '#FF33A8',  # Bright pink
+    '#A833FF',  # Bright violet
+    '#33FFD1',  # Bright teal
+    '#FF3333',  # Bright red
+    '#3366FF',  # Royal blue
+    '#8833FF',  # Purple
+    '#FF8C00',  # Dark orange
+    '#1E90FF',  # Dodger blue
+    '#32CD32',  # Lime green
+    '#FF1493',  # Deep pink
+    '#00CED1',  # Dark turquoise
+    '#FF6347',  # Tomato
+    '#4169E1',  # Royal blue
+    '#8A2BE2',  # Blue violet
+    '#228B22'   # Forest green
+)
+
 def get_random_color():
     """
     Generate a vibrant, high-contrast color for point datasets.
@@ -52,34 +134,10 @@ def get_random_color():
     Returns:
         str: Hex color code
     """
-    # List of vibrant colors that are easy to see
-    vibrant_colors = [
-        '#FF5733',  # Bright orange/red
-        '#33A8FF',  # Bright blue
-        '#47D147',  # Bright green
-        '#D147D1',  # Bright purple
-        '#FFD700',  # Gold
-        '#FF33A8',  # Bright pink
-        '#A833FF',  # Bright violet
-        '#33FFD1',  # Bright teal
-        '#FF3333',  # Bright red
-        '#3366FF',  # Royal blue
-        '#8833FF',  # Purple
-        '#FF8C00',  # Dark orange
-        '#1E90FF',  # Dodger blue
-        '#32CD32',  # Lime green
-        '#FF1493',  # Deep pink
-        '#00CED1',  # Dark turquoise
-        '#FF6347',  # Tomato
-        '#4169E1',  # Royal blue
-        '#8A2BE2',  # Blue violet
-        '#228B22'   # Forest green
-    ]
-    
     # If we've used all colors, use random selection with constraints
-    if hasattr(st.session_state, 'used_colors') and len(st.session_state.used_colors) >= len(vibrant_colors):
+    if hasattr(st.session_state, 'used_colors') and len(st.session_state.used_colors) >= len(_VIBRANT_COLORS):
         # Find unused colors first
-        unused_colors = [c for c in vibrant_colors if c not in st.session_state.used_colors]
+        unused_colors = [c for c in _VIBRANT_COLORS if c not in st.session_state.used_colors]
         if unused_colors:
             return random.choice(unused_colors)
         
@@ -98,11 +156,11 @@ def get_random_color():
         return f'#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}'
     else:
         # Get a color we haven't used yet
-        used_colors = getattr(st.session_state, 'used_colors', [])
-        available_colors = [c for c in vibrant_colors if c not in used_colors]
+        used_colors = getattr(st.session_state, 'used_colors', set())
+        available_colors = [c for c in _VIBRANT_COLORS if c not in used_colors]
         
         if not available_colors:  # If all used, recycle through them
-            return random.choice(vibrant_colors)
+            return random.choice(_VIBRANT_COLORS)
         
         return random.choice(available_colors)
 
@@ -117,45 +175,39 @@ def safe_to_json(gdf):
         dict: GeoJSON dictionary
     """
     try:
-        # Make a copy to avoid modifying the original
-        gdf_copy = gdf.copy()
+        # Make a shallow copy to avoid modifying the original
+        gdf_copy = gdf.copy(deep=False)
         
         # Convert any timestamp columns to strings
-        for col in gdf_copy.columns:
-            if col != 'geometry':
-                # Check data type
-                dtype_str = str(gdf_copy[col].dtype).lower()
-                if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                    gdf_copy[col] = gdf_copy[col].astype(str)
-                
-                # Also handle any array-like or complex objects
-                if 'object' in dtype_str:
-                    # Try to convert to string if it's a complex object
-                    try:
-                        gdf_copy[col] = gdf_copy[col].apply(lambda x: str(x) if x is not None else None)
-                    except:
-                        # If conversion fails, drop the column
-                        gdf_copy = gdf_copy.drop(columns=[col])
+        datetime_cols = gdf_copy.select_dtypes(include=['datetime', 'datetimetz']).columns
+        gdf_copy[datetime_cols] = gdf_copy[datetime_cols].astype(str)
+        
+        # Also handle any array-like or complex objects, converting all object
+        # columns to strings at once and keeping missing values as nulls
+        object_cols = gdf_copy.select_dtypes(include=['object']).columns
+        try:
+            gdf_copy[object_cols] = gdf_copy[object_cols].astype(str).where(gdf_copy[object_cols].notna(), None)
+        except:
+            # If conversion fails, drop the columns
+            gdf_copy = gdf_copy.drop(columns=object_cols)
         
-        # First attempt: standard to_json method with the cleaned dataframe
-        return json.loads(gdf_copy.to_json())
+        # First attempt: build the GeoJSON dict directly from the cleaned dataframe,
+        # without a round trip through a JSON string
+        return gdf_copy.to_geo_dict(na='null', show_bbox=False)
         
     except Exception as e:
         # Try alternative conversion with simplified geometries
         try:
-            simplified = gdf.copy()
+            simplified = gdf.copy(deep=False)
             
-            # Simplify geometries
-            simplified['geometry'] = simplified.geometry.simplify(tolerance=0.001)
+            # Simplify geometries in one vectorized call
+            simplified['geometry'] = shapely.simplify(simplified.geometry.values, 0.001, preserve_topology=True)
             
             # Convert timestamp columns to strings
-            for col in simplified.columns:
-                if col != 'geometry':
-                    dtype_str = str(simplified[col].dtype).lower()
-                    if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                        simplified[col] = simplified[col].astype(str)
+            datetime_cols = simplified.select_dtypes(include=['datetime', 'datetimetz']).columns
+            simplified[datetime_cols] = simplified[datetime_cols].astype(str)
             
-            return json.loads(simplified.to_json())
+            return simplified.to_geo_dict(na='null', show_bbox=False)
                 
         except Exception as simplify_err:
             raise ValueError("Unable to convert GeoDataFrame to GeoJSON")
@@ -178,12 +230,11 @@ def ensure_valid_geodataframe(gdf):
     if 'geometry' not in gdf.columns:
         raise ValueError("GeoDataFrame does not have a geometry column")
     
-    # Check for empty or null geometries and remove them
-    valid_gdf = gdf[~gdf.geometry.isna() & ~gdf.geometry.is_empty].copy()
-    
-    # Simplify geometries if the dataset is large
-    if len(valid_gdf) > 500:
-        valid_gdf['geometry'] = valid_gdf.geometry.simplify(tolerance=0.001)
+    # Check for empty or null geometries and remove them. Only the geometry column
+    # is written below, so a shallow copy is enough; copy-on-write keeps the
+    # input's columns untouched
+    geometries = gdf.geometry.values
+    valid_gdf = gdf.iloc[~(shapely.is_missing(geometries) | shapely.is_empty(geometries))].copy(deep=False)
     
     # Ensure the CRS is set
     if valid_gdf.crs is None:
@@ -191,13 +242,81 @@ def ensure_valid_geodataframe(gdf):
         valid_gdf.crs = "EPSG:4326"
     
     # Convert to WGS84 if needed
-    if str(valid_gdf.crs) != "EPSG:4326":
-        valid_gdf = valid_gdf.to_crs(epsg=4326)
+    if not WGS84.equals(valid_gdf.crs, ignore_axis_order=True):
+        valid_gdf = valid_gdf.to_crs(WGS84)
     
     return valid_gdf
 
 # Enhanced find_name_field function for file_utils.py
 
+# Common name field patterns in GIS datasets, in order of preference
+_NAME_PATTERNS = (
+    # Exact matches (case variations)
+    'name', 'NAME', 'Name',
+    'county', 'COUNTY', 'County',
+    'label', 'LABEL', 'Label',
+    'title', 'TITLE', 'Title',
+    'city', 'CITY', 'City',
+    'state', 'STATE', 'State',
+    'place', 'PLACE', 'Place',
+    'location', 'LOCATION', 'Location',
+    
+    # Combined patterns
+    'countyname', 'COUNTYNAME', 'CountyName', 'county_name', 'COUNTY_NAME',
+    'statename', 'STATENAME', 'StateName', 'state_name', 'STATE_NAME',
+    'cityname', 'CITYNAME', 'CityName', 'city_name', 'CITY_NAME',
+    'placename', 'PLACENAME', 'PlaceName', 'place_name', 'PLACE_NAME',
+    
+    # Prefixes and suffixes
+    'name_', 'NAME_', 'Name_',
+    '_name', '_NAME', '_Name',
+    'nam', 'NAM', 'Nam',
+    
+    # Additional county variations
+    'county_nm', 'cnty_name', 'co_name', 'cnty', 'co_nm',
+    'COUNTY_NM', 'CNTY_NAME', 'CO_NAME', 'CNTY', 'CO_NM'
+)
+
+# Substrings that mark a column name as a likely name field
+_NAME_SUBSTRINGS = ('name', 'county', 'city', 'label', 'title')
+
+# Number of values sampled when scoring a string column as a name field, and the
+# highest score a column can reach (every sampled value scores 6)
+NAME_SAMPLE_SIZE = 5
+NAME_MAX_SCORE = 6 * NAME_SAMPLE_SIZE
+
+# Common ID field names, lowercased for case-insensitive lookup
+_ID_PATTERNS = frozenset({'id', 'fid', 'gid', 'objectid', 'feature_id', 'featureid'})
+
+@functools.lru_cache(maxsize=64)
+def _name_field_by_columns(columns):
+    """
+    Find a name field from the column names alone.
+    
+    Args:
+        columns (tuple): Column names of the GeoDataFrame
+        
+    Returns:
+        str: Name of the matching column, or None if no name matches
+    """
+    # Check for direct exact matches first
+    column_set = set(columns)
+    for pattern in _NAME_PATTERNS:
+        if pattern in column_set:
+            logger.debug("Found exact match: %s", pattern)
+            return pattern
+    
+    # Check for columns containing the patterns
+    for col in columns:
+        col_lower = col.lower()
+        # Check if any of the patterns appear in the column name
+        for pattern in _NAME_SUBSTRINGS:
+            if pattern in col_lower and 'geom' not in col_lower and 'id' not in col_lower:
+                logger.debug("Found pattern match: %s contains '%s'", col, pattern)
+                return col
+    
+    return None
+
 def find_name_field(gdf):
     """
     Find the most likely column containing feature names with enhanced detection.
@@ -212,72 +331,35 @@ def find_name_field(gdf):
         return None
     
     # Debug the dataframe columns
-    print(f"Looking for name field in columns: {gdf.columns.tolist()}")
-    
-    # Common name field patterns in GIS datasets - expanded list
-    name_patterns = [
-        # Exact matches (case variations)
-        'name', 'NAME', 'Name',
-        'county', 'COUNTY', 'County',
-        'label', 'LABEL', 'Label',
-        'title', 'TITLE', 'Title',
-        'city', 'CITY', 'City',
-        'state', 'STATE', 'State',
-        'place', 'PLACE', 'Place',
-        'location', 'LOCATION', 'Location',
-        
-        # Combined patterns
-        'countyname', 'COUNTYNAME', 'CountyName', 'county_name', 'COUNTY_NAME',
-        'statename', 'STATENAME', 'StateName', 'state_name', 'STATE_NAME',
-        'cityname', 'CITYNAME', 'CityName', 'city_name', 'CITY_NAME',
-        'placename', 'PLACENAME', 'PlaceName', 'place_name', 'PLACE_NAME',
-        
-        # Prefixes and suffixes
-        'name_', 'NAME_', 'Name_',
-        '_name', '_NAME', '_Name',
-        'nam', 'NAM', 'Nam',
-        
-        # Additional county variations
-        'county_nm', 'cnty_name', 'co_name', 'cnty', 'co_nm',
-        'COUNTY_NM', 'CNTY_NAME', 'CO_NAME', 'CNTY', 'CO_NM'
-    ]
-    
-    # Check for direct exact matches first
-    for pattern in name_patterns:
-        if pattern in gdf.columns:
-            print(f"Found exact match: {pattern}")
-            return pattern
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Looking for name field in columns: %s", gdf.columns.tolist())
     
-    # Check for columns containing the patterns
-    for col in gdf.columns:
-        col_lower = col.lower()
-        # Check if any of the patterns appear in the column name
-        for pattern in ['name', 'county', 'city', 'label', 'title']:
-            if pattern in col_lower and 'geom' not in col_lower and 'id' not in col_lower:
-                print(f"Found pattern match: {col} contains '{pattern}'")
-                return col
+    # Matches on the column names alone are cached, since the same columns come back every rerun
+    name_field = _name_field_by_columns(tuple(gdf.columns))
+    if name_field is not None:
+        return name_field
     
     # Look for string columns that might contain names
     string_columns = []
     for col in gdf.columns:
-        if col != 'geometry' and gdf[col].dtype == 'object':
+        if col != 'geometry' and (gdf[col].dtype == 'object' or isinstance(gdf[col].dtype, pd.StringDtype)):
             # Sample value formats
-            sample = gdf[col].dropna().head(5)
+            sample = gdf[col].dropna().head(NAME_SAMPLE_SIZE)
+            sample = sample[[isinstance(val, str) for val in sample]].astype(object)
             if len(sample) > 0:
-                # Count string-like characteristics
-                score = 0
-                for val in sample:
-                    if isinstance(val, str):
-                        # Check for characteristics that suggest it's a name
-                        if ' ' in val:  # Contains spaces
-                            score += 2
-                        if val.istitle() or val.isupper():  # Title case or all caps
-                            score += 2
-                        if any(c.isalpha() for c in val):  # Contains letters
-                            score += 1
-                        if len(val) > 3:  # More than 3 characters
-                            score += 1
+                # Count string-like characteristics that suggest it's a name
+                text = sample.str
+                score = (
+                    2 * int(text.contains(' ', regex=False).sum()) +  # Contains spaces
+                    2 * int((text.istitle() | text.isupper()).sum()) +  # Title case or all caps
+                    int(text.contains(r'[^\W\d_]').sum()) +  # Contains letters
+                    int((text.len() > 3).sum())  # More than 3 characters
+                )
                 
+                if score >= NAME_MAX_SCORE:
+                    # No other column can score higher, so stop scanning
+                    logger.debug("Found string column match: %s with score %s", col, score)
+                    return col
                 if score > 5:  # Higher threshold for confidence
                     string_columns.append((col, score))
     
@@ -285,53 +367,64 @@ def find_name_field(gdf):
     if string_columns:
         string_columns.sort(key=lambda x: x[1], reverse=True)
         best_col, score = string_columns[0]
-        print(f"Found string column match: {best_col} with score {score}")
+        logger.debug("Found string column match: %s with score %s", best_col, score)
         return best_col
     
     # If all else fails, try to find the first non-numeric column
     for col in gdf.columns:
         if col != 'geometry' and not pd.api.types.is_numeric_dtype(gdf[col]):
-            print(f"Falling back to non-numeric column: {col}")
+            logger.debug("Falling back to non-numeric column: %s", col)
             return col
     
     # No suitable field found
-    print("No name field found")
+    logger.debug("No name field found")
     return None
 
-def find_id_field(gdf):
+@functools.lru_cache(maxsize=64)
+def _id_field_by_columns(columns):
     """
-    Find the most likely column containing feature IDs.
+    Find an ID field from the column names alone.
     
     Args:
-        gdf: GeoDataFrame to search
+        columns (tuple): Column names of the GeoDataFrame
         
     Returns:
-        str: Name of ID column, or None if not found
+        str: Name of the matching column, or None if no name matches
     """
-    if gdf is None or len(gdf) == 0:
-        return None
-    
-    # Common ID field patterns
-    id_patterns = [
-        'id', 'fid', 'gid', 'objectid', 'feature_id', 'featureid',
-        'ID', 'FID', 'GID', 'OBJECTID', 'FEATURE_ID', 'FEATUREID',
-        'Id', 'Fid', 'Gid', 'ObjectId', 'FeatureId', 'feature_id'
-    ]
-    
     # Check for direct matches
-    for col in gdf.columns:
-        if col.lower() in [p.lower() for p in id_patterns]:
+    for col in columns:
+        if col.lower() in _ID_PATTERNS:
             return col
     
     # Check for partial matches with _id
-    for col in gdf.columns:
+    for col in columns:
         if '_id' in col.lower() or 'id_' in col.lower():
             return col
     
     # Check for index column
-    if 'index' in gdf.columns:
+    if 'index' in columns:
         return 'index'
     
+    return None
+
+def find_id_field(gdf):
+    """
+    Find the most likely column containing feature IDs.
+    
+    Args:
+        gdf: GeoDataFrame to search
+        
+    Returns:
+        str: Name of ID column, or None if not found
+    """
+    if gdf is None or len(gdf) == 0:
+        return None
+    
+    # Matches on the column names alone are cached, since the same columns come back every rerun
+    id_field = _id_field_by_columns(tuple(gdf.columns))
+    if id_field is not None:
+        return id_field
+    
     # Fallback to first numeric column that has unique values
     for col in gdf.columns:
         if col != 'geometry':
@@ -1,7 +1,14 @@
 # utils/geo_processing.py
 import geopandas as gpd
+import pandas as pd
 import numpy as np
+import shapely
 import streamlit as st
+import matplotlib
+import matplotlib.colors as mcolors
+
+# Two-digit hex for every byte value, for building color strings in bulk
+_HEX_BYTES = np.array([f'{i:02x}' for i in range(256)], dtype=object)
 
 def normalize_values(series, inverse=False):
     """
@@ -12,25 +19,45 @@ def normalize_values(series, inverse=False):
         inverse: If True, invert the normalization (1 becomes 0, 0 becomes 1)
         
     Returns:
-        pandas Series: Normalized values
+        pandas Series: Normalized values as float32
     """
-    # Replace NaN values with 0
-    series = series.fillna(0)
+    # Work on a float32 array with NaN values replaced by 0; normalized
+    # values only need float32 precision, at half the memory
+    arr = series.fillna(0).to_numpy(dtype=np.float32)
+    min_val = arr.min() if len(arr) else 0
+    max_val = arr.max() if len(arr) else 0
     
     # Check if all values are the same
-    if series.min() == series.max():
-        return series.map(lambda x: 1.0)  # All equal values get normalized to 1
+    if min_val == max_val:
+        return pd.Series(np.ones_like(arr), index=series.index)  # All equal values get normalized to 1
     
     # Normalize
-    min_val = series.min()
-    max_val = series.max()
-    normalized = (series - min_val) / (max_val - min_val)
+    normalized = (arr - min_val) / (max_val - min_val)
     
     # Invert if needed
     if inverse:
         normalized = 1 - normalized
         
-    return normalized
+    return pd.Series(normalized, index=series.index)
+
+def _percent_coverage(intersecting, column, boundary_feature):
+    """Share of the boundary feature's area covered by the intersecting features, in percent."""
+    if boundary_feature.area > 0:
+        return intersecting.area.sum() / boundary_feature.area * 100
+    return 0
+
+# Operations on the features intersecting a boundary feature, looked up by name;
+# each takes (intersecting, column, boundary_feature)
+_OPS = {
+    'Count Features': lambda intersecting, column, boundary_feature: len(intersecting),
+    'Sum Values': lambda intersecting, column, boundary_feature: intersecting[column].sum(),
+    'Average Values': lambda intersecting, column, boundary_feature: intersecting[column].mean(),
+    'Minimum Value': lambda intersecting, column, boundary_feature: intersecting[column].min(),
+    'Maximum Value': lambda intersecting, column, boundary_feature: intersecting[column].max(),
+    'Area Within Boundary': lambda intersecting, column, boundary_feature: intersecting.area.sum(),
+    'Length Within Boundary': lambda intersecting, column, boundary_feature: intersecting.length.sum(),
+    'Percent Coverage': _percent_coverage
+}
 
 @st.cache_data
 def spatial_operation(boundary_feature, dataset, operation, column=None):
@@ -47,46 +74,70 @@ def spatial_operation(boundary_feature, dataset, operation, column=None):
     Returns:
         float: Result of the spatial operation
     """
-    # Filter dataset to only features that intersect with the boundary
-    intersecting = dataset[dataset.intersects(boundary_feature)]
+    # Work with the feature's geometry itself so it can be passed to the spatial index
+    if isinstance(boundary_feature, gpd.GeoSeries):
+        boundary_feature = boundary_feature.iloc[0]
+    
+    # Prepare the boundary once; the prepared state stays on the geometry, so later
+    # calls for the same feature skip rebuilding it in GEOS
+    shapely.prepare(boundary_feature)
+    
+    # The distance only needs the closest feature, which the spatial index finds directly
+    if operation == 'Distance to Nearest':
+        if len(dataset) == 0:
+            return np.nan
+        _, nearest = dataset.sindex.nearest(boundary_feature)
+        return shapely.distance(boundary_feature, dataset.geometry.values[nearest]).min()
+    
+    op = _OPS.get(operation)
+    if op is None:
+        raise ValueError(f"Unknown operation: {operation}")
+    
+    # Filter dataset to only features that intersect with the boundary, testing
+    # just the candidates whose bounding boxes overlap it
+    intersecting = dataset.iloc[np.sort(dataset.sindex.query(boundary_feature, predicate='intersects'))]
     
-    if len(intersecting) == 0 and operation not in ['Distance to Nearest']:
+    if len(intersecting) == 0:
         return 0  # No intersecting features
     
     # Perform the requested operation
-    if operation == 'Count Features':
-        return len(intersecting)
-    
-    elif operation == 'Sum Values':
-        return intersecting[column].sum() if len(intersecting) > 0 else 0
-    
-    elif operation == 'Average Values':
-        return intersecting[column].mean() if len(intersecting) > 0 else 0
-    
-    elif operation == 'Minimum Value':
-        return intersecting[column].min() if len(intersecting) > 0 else np.nan
-    
-    elif operation == 'Maximum Value':
-        return intersecting[column].max() if len(intersecting) > 0 else np.nan
-    
-    elif operation == 'Area Within Boundary':
-        return intersecting.area.sum()
-    
-    elif operation == 'Length Within Boundary':
-        if hasattr(intersecting.iloc[0].geometry, 'length') if len(intersecting) > 0 else False:
-            return intersecting.length.sum()
-        return 0
-    
-    elif operation == 'Distance to Nearest':
-        return boundary_feature.distance(dataset.unary_union)
-    
-    elif operation == 'Percent Coverage':
-        if boundary_feature.area > 0:
-            return intersecting.area.sum() / boundary_feature.area * 100
-        return 0
+    return op(intersecting, column, boundary_feature)
+
+class ColorScale:
+    """
+    Maps values onto a matplotlib colormap as hex colors.
+    Call it with one value, or use get_colors for a whole array at once.
+    """
     
-    else:
-        raise ValueError(f"Unknown operation: {operation}")
+    def __init__(self, min_val, max_val, palette='viridis'):
+        """
+        Initialize the color scale.
+        
+        Args:
+            min_val: Minimum value in the scale
+            max_val: Maximum value in the scale
+            palette: Color palette name (viridis, plasma, inferno, etc.)
+        """
+        self.cmap = matplotlib.colormaps[palette]
+        self.norm = mcolors.Normalize(vmin=min_val, vmax=max_val)
+    
+    def __call__(self, value):
+        """Return the hex color for a single value."""
+        return mcolors.to_hex(self.cmap(self.norm(value)))
+    
+    def get_colors(self, values):
+        """
+        Return the hex colors for an array of values in one pass.
+        
+        Args:
+            values: Array-like of values
+            
+        Returns:
+            numpy array: Hex color strings, one per value
+        """
+        rgba = self.cmap(self.norm(np.asarray(values, dtype=float)))
+        rgb = np.round(np.atleast_2d(rgba)[:, :3] * 255).astype(np.uint8)
+        return '#' + _HEX_BYTES[rgb[:, 0]] + _HEX_BYTES[rgb[:, 1]] + _HEX_BYTES[rgb[:, 2]]
 
 def create_color_scale(min_val, max_val, palette='viridis'):
     """
@@ -99,23 +150,7 @@ def create_color_scale(min_val, max_val, palette='viridis'):
         palette: Color palette name (viridis, plasma, inferno, etc.)
         
     Returns:
-        function: A function that takes a value and returns a color
+        ColorScale: Callable that takes a value and returns a color; its
+            get_colors method maps a whole array of values
     """
-    import matplotlib.pyplot as plt
-    import matplotlib.colors as mcolors
-    
-    # Create a colormap
-    cmap = plt.get_cmap(palette)
-    
-    # Create a normalization function
-    norm = mcolors.Normalize(vmin=min_val, vmax=max_val)
-    
-    # Create a color mapper function
-    def get_color(value):
-        # Convert the normalized value to a color
-        rgba = cmap(norm(value))
-        # Convert to hex
-        hex_color = mcolors.to_hex(rgba)
-        return hex_color
-    
-    return get_color
\ No newline at end of file
+    return ColorScale(min_val, max_val, palette)
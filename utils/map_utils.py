@@ -1,12 +1,252 @@
 # utils/map_utils.py
 import folium
+from jinja2 import Template
+from branca.element import MacroElement
 from streamlit_folium import st_folium
-import json
-import time
+import hashlib
 import streamlit as st
 import pandas as pd
+import geopandas as gpd
 import numpy as np
-from utils.file_utils import safe_to_json, ensure_valid_geodataframe, get_random_color, find_name_field, find_id_field
+import shapely
+from utils.file_utils import safe_to_json, ensure_valid_geodataframe, get_random_color, find_name_field, find_id_field, WGS84
+
+def _geometry_row_hashes(gdf):
+    """
+    Hash each geometry's WKB, giving missing geometries their own fixed hash.
+    
+    Args:
+        gdf: GeoDataFrame whose geometries should be hashed
+        
+    Returns:
+        bytes: One 64-bit hash per row, in row order
+    """
+    return pd.util.hash_pandas_object(gdf.geometry.to_wkb(), index=False).values.tobytes()
+
+def gdf_content_hash(gdf):
+    """
+    Compute a content hash for a GeoDataFrame from its geometry WKB and attribute values.
+    
+    Args:
+        gdf: GeoDataFrame to hash
+        
+    Returns:
+        str: Hex digest identifying the GeoDataFrame contents
+    """
+    hasher = hashlib.md5()
+    hasher.update(_geometry_row_hashes(gdf))
+    
+    attributes = gdf.drop(columns=gdf.geometry.name)
+    hasher.update(','.join(map(str, attributes.columns)).encode())
+    try:
+        hasher.update(pd.util.hash_pandas_object(attributes).values.tobytes())
+    except TypeError:
+        # Unhashable values (lists, dicts) - fall back to their string form
+        hasher.update(pd.util.hash_pandas_object(attributes.astype(str)).values.tobytes())
+    
+    return hasher.hexdigest()
+
+def _display_simplified(geometries, min_tolerance=0.0):
+    """
+    Simplify boundary geometries for display according to their complexity.
+    Tolerances are in degrees: 0.01 above 1000 vertices, 0.001 above 200, and
+    at least min_tolerance for every geometry. Only used for drawing; the
+    analysis keeps the boundary at full resolution.
+    
+    Args:
+        geometries: Array of shapely geometries in EPSG:4326
+        min_tolerance: Tolerance applied to every geometry
+        
+    Returns:
+        numpy array: Simplified geometries (the input itself if nothing needs simplifying)
+    """
+    num_coords = shapely.get_num_coordinates(geometries)
+    tolerance = np.where(num_coords > 1000, 0.01, np.where(num_coords > 200, 0.001, min_tolerance))
+    if not tolerance.any():
+        return geometries
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+def _boundary_layer_data(boundary):
+    """
+    Prepare the project boundary for display, once per boundary.
+    The result is kept in session state for as long as the project holds the
+    same boundary object, so reruns skip validation, simplification and conversion.
+    
+    Args:
+        boundary: The project's boundary GeoDataFrame
+        
+    Returns:
+        tuple: (GeoJSON FeatureCollection dict in EPSG:4326, name field or None)
+    """
+    cached = st.session_state.get('boundary_layer_cache')
+    if cached is not None and cached[0] is boundary:
+        return cached[1], cached[2]
+    
+    # Get the boundary dataset and ensure it's valid
+    gdf = ensure_valid_geodataframe(boundary)
+    
+    # Try to find a name field for the boundary
+    name_field = find_name_field(gdf)
+    
+    # Simplify detailed geometries, and every geometry of large boundaries
+    gdf = gdf.copy(deep=False)
+    gdf['geometry'] = _display_simplified(gdf.geometry.values, 0.001 if len(gdf) > 100 else 0.0)
+    
+    geo_json_data = safe_to_json(gdf)
+    
+    # Hold the boundary itself rather than its id, so a new boundary can never match
+    st.session_state.boundary_layer_cache = (boundary, geo_json_data, name_field)
+    return geo_json_data, name_field
+
+def gdf_geometry_hash(gdf):
+    """
+    Compute a hash of a GeoDataFrame's geometry only, ignoring its attributes.
+    
+    Args:
+        gdf: GeoDataFrame to hash
+        
+    Returns:
+        str: Hex digest identifying the geometries and their CRS
+    """
+    hasher = hashlib.md5(str(gdf.crs).encode())
+    hasher.update(_geometry_row_hashes(gdf))
+    return hasher.hexdigest()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _display_geometries(_gdf, geometry_hash):
+    """
+    Reproject, simplify and convert a GeoDataFrame's geometries to GeoJSON dicts.
+    Cached as a resource so the same geometry dicts are shared by every rerun and
+    every analysis on the same boundary; callers must not modify them.
+    
+    Args:
+        _gdf: GeoDataFrame whose geometries should be displayed
+        geometry_hash: Result of gdf_geometry_hash(_gdf)
+        
+    Returns:
+        tuple: (list of GeoJSON geometry dicts, total bounds in EPSG:4326)
+    """
+    geometry = _gdf.geometry
+    if geometry.crs and not WGS84.equals(geometry.crs, ignore_axis_order=True):
+        geometry = geometry.to_crs(WGS84)
+    
+    # Simplify detailed geometries, and every geometry of large results
+    geometry = gpd.GeoSeries(_display_simplified(geometry.values, 0.001 if len(geometry) > 500 else 0.0),
+                             index=geometry.index, crs=geometry.crs)
+    
+    features = geometry.to_frame().to_geo_dict(show_bbox=False)['features']
+    return [feature['geometry'] for feature in features], geometry.total_bounds
+
+def suitability_colors(values, min_val, max_val):
+    """
+    Map scores onto the results color ramp: light red (#ffcccc) to yellow (#ffff99) to green (#66cc66).
+    
+    Args:
+        values: Array of scores
+        min_val: Score drawn in light red
+        max_val: Score drawn in green
+        
+    Returns:
+        list: Hex color string for each value
+    """
+    values = np.asarray(values, dtype=float)
+    
+    # Normalize values; if all values are the same, use full color
+    if min_val == max_val:
+        normalized = np.ones_like(values)
+    else:
+        normalized = (values - min_val) / (max_val - min_val)
+    
+    # First half maps 0-0.5 onto light red to yellow, second half 0.5-1 onto yellow to green
+    first_half = normalized < 0.5
+    local_norm = np.where(first_half, normalized * 2, (normalized - 0.5) * 2)
+    r = np.where(first_half, 255, 255 - local_norm * (255 - 102)).astype(int)
+    g = np.where(first_half, 204 + local_norm * (255 - 204), 255 - local_norm * (255 - 204)).astype(int)
+    b = np.where(first_half, 204 + local_norm * (153 - 204), 153 - local_norm * (153 - 102)).astype(int)
+    
+    return [f'#{r_:02x}{g_:02x}{b_:02x}' for r_, g_, b_ in zip(r, g, b)]
+
+class CircleMarkerLayer(folium.FeatureGroup):
+    """
+    Map layer drawing a point dataset as circle markers from plain [lat, lon] pairs.
+    Each marker is created in the browser from the coordinate list, so the page
+    doesn't carry a GeoJSON feature for every point, and all markers are drawn on
+    one canvas rather than as an SVG element each.
+    """
+    
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_renderer = L.canvas();
+            var {{ this.get_name() }} = L.featureGroup(
+                {{ this.points|tojson }}.map(function (latlng) {
+                    return L.circleMarker(latlng, Object.assign(
+                        {renderer: {{ this.get_name() }}_renderer},
+                        {{ this.marker_options|tojson }}
+                    ));
+                })
+            );
+        {% endmacro %}
+        """)
+    
+    def __init__(self, points, name=None, **marker_options):
+        """
+        Initialize the layer.
+        
+        Args:
+            points (list): [lat, lon] pair for each marker
+            name (str, optional): Name shown in the layer control
+            **marker_options: Leaflet circleMarker options (radius, color, fillColor, ...)
+        """
+        super().__init__(name=name)
+        self._name = 'CircleMarkerLayer'
+        self.points = points
+        self.marker_options = marker_options
+
+class LayerStyle(MacroElement):
+    """
+    Applies one fixed style to every feature of its parent GeoJson layer.
+    Unlike a constant style_function, the style is written to the page once
+    instead of being computed and stored for each feature.
+    """
+    
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this._parent.get_name() }}.setStyle({{ this.style|tojson }});
+        {% endmacro %}
+        """)
+    
+    def __init__(self, style):
+        """
+        Initialize the style.
+        
+        Args:
+            style (dict): Leaflet path options (fillColor, color, weight, ...)
+        """
+        super().__init__()
+        self._name = 'LayerStyle'
+        self.style = style
+
+# Simplification tolerance in degrees by feature count, as (up to n features, tolerance)
+DISPLAY_TOLERANCES = ((500, 0.0), (5_000, 0.0005), (50_000, 0.002))
+DISPLAY_TOLERANCE_MAX = 0.01
+
+# Point layers are sampled down to this many markers; simplification can't reduce them
+MAX_DISPLAY_POINTS = 5_000
+
+def display_tolerance(n_features):
+    """
+    Pick the simplification tolerance for displaying a dataset on the map.
+    
+    Args:
+        n_features (int): Number of features in the dataset
+        
+    Returns:
+        float: Tolerance in degrees, 0 to display full resolution
+    """
+    for max_features, tolerance in DISPLAY_TOLERANCES:
+        if n_features <= max_features:
+            return tolerance
+    return DISPLAY_TOLERANCE_MAX
 
 def add_map_layer(gdf, name, style=None):
     """
@@ -23,37 +263,35 @@ def add_map_layer(gdf, name, style=None):
     if gdf is None or len(gdf) == 0:
         return False
     
+    # Reruns often add the same data again; keep the existing layer if nothing changed.
+    # A dataset that can't be hashed is still added, just without the check
+    try:
+        source_key = (gdf_content_hash(gdf), str(gdf.crs), repr(style))
+    except Exception:
+        source_key = None
+    if source_key is not None and st.session_state.map_layers.get(name, {}).get('source_key') == source_key:
+        return True
+    
     try:
         # Convert to WGS84 if needed
-        if gdf.crs and str(gdf.crs) != "EPSG:4326":
-            gdf = gdf.to_crs(epsg=4326)
+        if gdf.crs and not WGS84.equals(gdf.crs, ignore_axis_order=True):
+            gdf = gdf.to_crs(WGS84)
         
-        # Handle large datasets by simplifying
-        gdf_to_display = gdf.copy()
-        if len(gdf) > 1000:
-            gdf_to_display['geometry'] = gdf_to_display.geometry.simplify(tolerance=0.001)
+        # Keep large datasets to a manageable size by simplifying every feature,
+        # more coarsely the more features there are, rather than dropping any
+        gdf_to_display = gdf.copy(deep=False)
+        tolerance = display_tolerance(len(gdf))
+        if tolerance:
+            gdf_to_display['geometry'] = shapely.simplify(gdf_to_display.geometry.values, tolerance, preserve_topology=True)
             
         # Handle timestamp columns to ensure proper serialization
-        for col in gdf_to_display.columns:
-            if col != 'geometry':
-                dtype_str = str(gdf_to_display[col].dtype).lower()
-                if 'datetime' in dtype_str or 'timestamp' in dtype_str:
-                    gdf_to_display[col] = gdf_to_display[col].astype(str)
+        datetime_cols = gdf_to_display.select_dtypes(include=['datetime', 'datetimetz']).columns
+        gdf_to_display[datetime_cols] = gdf_to_display[datetime_cols].astype(str)
         
-        # Create GeoJSON with manageable size
-        if len(gdf) > 500:
-            # For very large datasets, use random sampling
-            sample_size = min(500, len(gdf))
-            sample_gdf = gdf_to_display.sample(sample_size)
-            geo_data = json.loads(sample_gdf.to_json())
-        else:
-            geo_data = json.loads(gdf_to_display.to_json())
-        
-        # Determine if this is a point dataset based on the first geometry
-        is_point_dataset = False
-        if 'geometry' in gdf.columns and len(gdf) > 0:
-            first_geom_type = gdf.geometry.iloc[0].geom_type
-            is_point_dataset = first_geom_type == 'Point'
+        # Determine if this is a point dataset: every (non-missing) geometry is a Point
+        type_ids = shapely.get_type_id(gdf.geometry.values)
+        type_ids = type_ids[type_ids >= 0]
+        is_point_dataset = len(type_ids) > 0 and bool((type_ids == shapely.GeometryType.POINT).all())
         
         # If it's a point dataset, use circle markers with random colors
         if is_point_dataset:
@@ -63,7 +301,7 @@ def add_map_layer(gdf, name, style=None):
                 color = get_random_color()
             
             # Add to used colors
-            st.session_state.used_colors.append(color)
+            st.session_state.used_colors.add(color)
             
             # Create point style
             point_style = {
@@ -74,10 +312,24 @@ def add_map_layer(gdf, name, style=None):
                 'fillOpacity': 0.7
             }
             
+            # Points are drawn from their [lat, lon] pairs alone, which is far smaller
+            # than a GeoJSON feature per point
+            points = gdf.geometry.values
+            points = points[~shapely.is_missing(points)]
+            total_points = len(points)
+            
+            # Keep large point layers to a manageable size with a fixed sample, so
+            # reruns show the same points
+            if total_points > MAX_DISPLAY_POINTS:
+                keep = np.random.default_rng(0).choice(total_points, MAX_DISPLAY_POINTS, replace=False)
+                points = points[np.sort(keep)]
+            
             # Add to map layers
             st.session_state.map_layers[name] = {
-                'data': geo_data,
-                'point_style': point_style
+                'points': np.column_stack([shapely.get_y(points), shapely.get_x(points)]).tolist(),
+                'total_points': total_points,
+                'point_style': point_style,
+                'source_key': source_key
             }
         else:
             # Default style if none provided for non-point datasets
@@ -100,8 +352,9 @@ def add_map_layer(gdf, name, style=None):
             
             # Add to map layers
             st.session_state.map_layers[name] = {
-                'data': geo_data,
-                'style': style
+                'data': gdf_to_display.to_geo_dict(na='null', show_bbox=False),
+                'style': style,
+                'source_key': source_key
             }
         
         # Update map center if this is the first layer
@@ -119,7 +372,7 @@ def add_map_layer(gdf, name, style=None):
     except Exception as e:
         return False
 
-def add_results_layer(result_gdf, value_column='suitability_score', title='Suitability Results'):
+def add_results_layer(result_gdf, value_column='suitability_score', title='Suitability Results', refresh_map=True):
     """
     Add analysis results as a layer on the map with a more intuitive color gradient.
     
@@ -127,22 +380,16 @@ def add_results_layer(result_gdf, value_column='suitability_score', title='Suita
         result_gdf: GeoDataFrame containing the results
         value_column: Column name to use for coloring
         title: Title for the layer
+        refresh_map: Whether to force the map to redraw with the new layer
     """
     if result_gdf is None or len(result_gdf) == 0:
         st.warning("No results to display")
         return
     
-    # Convert to WGS84 if needed
-    if result_gdf.crs and str(result_gdf.crs) != "EPSG:4326":
-        result_gdf = result_gdf.to_crs(epsg=4326)
-    
     # Get min and max values for coloring
     min_val = result_gdf[value_column].min()
     max_val = result_gdf[value_column].max()
     
-    # Round suitability scores to 2 decimal places
-    result_gdf[value_column] = result_gdf[value_column].round(2)
-    
     # Try to find a name column for features
     name_field = find_name_field(result_gdf)
     
@@ -150,63 +397,23 @@ def add_results_layer(result_gdf, value_column='suitability_score', title='Suita
     if min_val == max_val:
         st.info(f"All areas have the same {value_column} value: {min_val:.2f}")
     
-    # Create style function for the results with improved color ramp
-    def style_function(feature):
-        value = feature['properties'].get(value_column, min_val)
-        
-        # Normalize value
-        if min_val == max_val:
-            normalized = 1.0  # If all values are the same, use full color
-        else:
-            normalized = (value - min_val) / (max_val - min_val)
-        
-        # Color ramp: light red (#ffcccc) to yellow (#ffff99) to green (#66cc66)
-        if normalized < 0.5:
-            # First half: light red to yellow
-            # Map 0-0.5 to 0-1
-            local_norm = normalized * 2
-            # Interpolate between light red and yellow
-            r = 255
-            g = int(204 + local_norm * (255 - 204))
-            b = int(204 + local_norm * (153 - 204))
-        else:
-            # Second half: yellow to green
-            # Map 0.5-1 to 0-1
-            local_norm = (normalized - 0.5) * 2
-            # Interpolate between yellow and green
-            r = int(255 - local_norm * (255 - 102))
-            g = int(255 - local_norm * (255 - 204))
-            b = int(153 - local_norm * (153 - 102))
-        
-        color = f'#{r:02x}{g:02x}{b:02x}'
-        
-        return {
-            'fillColor': color,
-            'color': '#666666',  # darker grey border
-            'weight': 1,
-            'fillOpacity': 0.8
-        }
-    
     # Add results to map layers with better handling for edge cases
     try:
-        # Handle large results with simplification
-        result_for_display = result_gdf.copy()
-        if len(result_for_display) > 500:
-            result_for_display['geometry'] = result_for_display.geometry.simplify(tolerance=0.001)
+        # The geometry only changes with the boundary, so it is converted once and
+        # shared; each analysis just attaches new scores and colors by feature id
+        geometries, bounds = _display_geometries(result_gdf, gdf_geometry_hash(result_gdf))
+        feature_ids = [str(i) for i in range(len(result_gdf))]
         
-        # Make sure all properties are serializable
-        for col in result_for_display.columns:
-            if col != 'geometry':
-                try:
-                    # Try to convert complex data types to string
-                    if result_for_display[col].dtype.name == 'object':
-                        result_for_display[col] = result_for_display[col].astype(str)
-                except:
-                    # If conversion fails, drop the column
-                    result_for_display = result_for_display.drop(columns=[col])
+        # Color each feature by id; the style function only looks the color up
+        feature_colors = dict(zip(feature_ids, suitability_colors(result_gdf[value_column], min_val, max_val)))
         
-        # Convert to GeoJSON
-        result_geo_json = safe_to_json(result_for_display)
+        def style_function(feature):
+            return {
+                'fillColor': feature_colors[feature['id']],
+                'color': '#666666',  # darker grey border
+                'weight': 1,
+                'fillOpacity': 0.8
+            }
         
         # Create tooltip fields based on available columns
         tooltip_fields = [value_column]
@@ -218,11 +425,25 @@ def add_results_layer(result_gdf, value_column='suitability_score', title='Suita
             tooltip_aliases.insert(0, 'Name:')
         else:
             # Use ID field as fallback
-            id_field = find_id_field(result_for_display)
+            id_field = find_id_field(result_gdf)
             if id_field:
                 tooltip_fields.insert(0, id_field)
                 tooltip_aliases.insert(0, 'ID:')
         
+        # Only the tooltip fields are carried as properties, as plain Python values
+        properties = pd.DataFrame({
+            field: result_gdf[field].astype(float).round(2) if field == value_column else result_gdf[field].astype(str)
+            for field in tooltip_fields
+        }).to_dict('records')
+        
+        result_geo_json = {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'id': feature_id, 'geometry': geometry, 'properties': props}
+                for feature_id, geometry, props in zip(feature_ids, geometries, properties)
+            ]
+        }
+        
         # Add to session state map layers
         st.session_state.map_layers[title] = {
             'data': result_geo_json,
@@ -233,11 +454,11 @@ def add_results_layer(result_gdf, value_column='suitability_score', title='Suita
         }
         
         # Update map center based on the results
-        bounds = result_for_display.total_bounds
         st.session_state.map_center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
         
         # Force map refresh
-        st.session_state.force_map_refresh = True
+        if refresh_map:
+            st.session_state.force_map_refresh = True
         
         # Success message
         st.success(f"Results displayed on map with color gradient from low (red) to high (green).")
@@ -293,17 +514,16 @@ def display_map_with_st_folium():
     """, unsafe_allow_html=True)
     
     # Initialize session state variables only once
-    if 'map_initialized' not in st.session_state:
-        st.session_state.map_initialized = False
-        st.session_state.current_map_key = "initial_map"
+    if 'map_refresh_count' not in st.session_state:
+        st.session_state.map_refresh_count = 0
         st.session_state.last_boundary_key = None
     
-    # Create a stable key that doesn't change on regular reruns
-    # Only change the key when forcing a refresh
-    key_to_use = st.session_state.current_map_key
+    # Keep the same key across reruns so the frontend keeps the mounted map.
+    # st_folium already remounts when the map contents change, so the key only
+    # needs to change for an explicit refresh of an otherwise identical map
     if st.session_state.force_map_refresh:
-        key_to_use = f"map_{len(st.session_state.map_layers.keys())}_{st.session_state.has_result}_{time.time()}"
-        st.session_state.current_map_key = key_to_use
+        st.session_state.map_refresh_count += 1
+    key_to_use = f"main_map_{st.session_state.map_refresh_count}"
     
     # Determine location and zoom
     location = st.session_state.map_center
@@ -333,16 +553,12 @@ def display_map_with_st_folium():
     # Store boundary bounds for fit_bounds
     boundary_bounds = None
     should_fit_bounds = False
-    fit_bounds_to = None
     
     # Store boundary for home button functionality
-    if hasattr(st.session_state.project, 'boundary_dataset') and st.session_state.project.boundary_dataset is not None:
+    if st.session_state.project.boundary_dataset is not None:
         try:
-            # Get the boundary dataset and ensure it's valid
-            gdf = ensure_valid_geodataframe(st.session_state.project.boundary_dataset)
-            
-            # Get bounds for later use
-            bounds = gdf.total_bounds
+            # Get bounds for later use (computed once when the boundary was set)
+            bounds = st.session_state.project.boundary_bounds
             boundary_bounds = [
                 [bounds[1], bounds[0]],  # SW corner
                 [bounds[3], bounds[2]]   # NE corner
@@ -360,7 +576,6 @@ def display_map_with_st_folium():
             if ('last_zoom_key' in st.session_state and 
                 st.session_state.last_zoom_key != str(id(st.session_state.project.boundary_dataset))):
                 should_fit_bounds = True
-                fit_bounds_to = gdf
                 st.session_state.last_zoom_key = str(id(st.session_state.project.boundary_dataset))
             
         except Exception as e:
@@ -369,7 +584,7 @@ def display_map_with_st_folium():
     # Sort layers into categories
     regular_layers = {}
     result_layers = {}
-    if hasattr(st.session_state, 'map_layers') and st.session_state.map_layers:
+    if st.session_state.map_layers:
         for layer_name, layer_info in st.session_state.map_layers.items():
             if layer_info.get('is_results', False) or 'Suitability' in layer_name:
                 result_layers[layer_name] = layer_info
@@ -377,34 +592,23 @@ def display_map_with_st_folium():
                 regular_layers[layer_name] = layer_info
     
     # Add boundary if available
-    if hasattr(st.session_state.project, 'boundary_dataset') and st.session_state.project.boundary_dataset is not None:
+    if st.session_state.project.boundary_dataset is not None:
         try:
-            # Get the boundary dataset and ensure it's valid
-            gdf = ensure_valid_geodataframe(st.session_state.project.boundary_dataset)
-            
-            # Try to find a name field for the boundary
-            name_field = find_name_field(gdf)
-            
-            # Handle large boundaries by simplifying
-            if len(gdf) > 100:
-                gdf = gdf.copy()
-                gdf['geometry'] = gdf.geometry.simplify(tolerance=0.001)
-                
-            # Convert to GeoJSON
-            geo_json_data = json.loads(gdf.to_json())
+            # Convert to GeoJSON (reused across reruns while the boundary is unchanged)
+            geo_json_data, name_field = _boundary_layer_data(st.session_state.project.boundary_dataset)
             
             # Create boundary GeoJSON layer
             boundary_layer = folium.GeoJson(
                 data=geo_json_data,
-                name="Boundary",
-                style_function=lambda x: {
-                    'fillColor': '#a9a9a9',
-                    'color': '#404040',
-                    'weight': 2,
-                    'fillOpacity': 0.5,
-                    'opacity': 0.8
-                }
+                name="Boundary"
             )
+            boundary_layer.add_child(LayerStyle({
+                'fillColor': '#a9a9a9',
+                'color': '#404040',
+                'weight': 2,
+                'fillOpacity': 0.5,
+                'opacity': 0.8
+            }))
             
             # Add tooltip if name field is available
             if name_field:
@@ -426,7 +630,7 @@ def display_map_with_st_folium():
             if should_fit_bounds or st.session_state.force_map_refresh or 'zoom_boundary_btn' in st.session_state:
                 m.fit_bounds(boundary_bounds)
                 # Update center in session state based on bounds
-                st.session_state.map_center = [(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2]
+                st.session_state.map_center = st.session_state.project.boundary_center
                 
         except Exception as e:
             st.error(f"Error adding boundary layer: {str(e)}")
@@ -442,28 +646,25 @@ def display_map_with_st_folium():
                 ).add_to(m)
                 
             elif 'point_style' in layer_info:
-                # For point layers, use CircleMarker
-                point_style = layer_info['point_style']
-                
-                folium.GeoJson(
-                    data=layer_info['data'],
+                # For point layers, draw circle markers straight from the coordinates
+                CircleMarkerLayer(
+                    layer_info['points'],
                     name=layer_name,
-                    marker=folium.CircleMarker(
-                        radius=point_style.get('radius', 5),
-                        weight=point_style.get('weight', 1),
-                        color=point_style.get('color', '#000000'),
-                        fill_color=point_style.get('fillColor', '#000000'),
-                        fill_opacity=point_style.get('fillOpacity', 0.7)
-                    )
+                    **layer_info['point_style']
                 ).add_to(m)
                 
+                # Say when only a sample of the points is shown
+                total_points = layer_info.get('total_points', len(layer_info['points']))
+                if total_points > len(layer_info['points']):
+                    st.caption(f"{layer_name}: showing {len(layer_info['points']):,} of {total_points:,} points")
+                
             else:
-                style = layer_info.get('style', {})
-                folium.GeoJson(
+                layer = folium.GeoJson(
                     data=layer_info['data'],
-                    name=layer_name,
-                    style_function=lambda x: style
-                ).add_to(m)
+                    name=layer_name
+                )
+                layer.add_child(LayerStyle(layer_info.get('style', {})))
+                layer.add_to(m)
         except Exception as e:
             # More informative error handling
             st.warning(f"Could not add layer '{layer_name}': {str(e)}")
@@ -507,16 +708,17 @@ def display_map_with_st_folium():
                 
             else:
                 # Fallback for results without style function
-                folium.GeoJson(
+                layer = folium.GeoJson(
                     data=layer_info['data'],
-                    name=layer_name,
-                    style_function=lambda x: {
-                        'fillColor': '#66cc66',  # Light green
-                        'color': '#666666',  # Dark grey border
-                        'weight': 1,
-                        'fillOpacity': 0.7
-                    }
-                ).add_to(m)
+                    name=layer_name
+                )
+                layer.add_child(LayerStyle({
+                    'fillColor': '#66cc66',  # Light green
+                    'color': '#666666',  # Dark grey border
+                    'weight': 1,
+                    'fillOpacity': 0.7
+                }))
+                layer.add_to(m)
                 
         except Exception as e:
             st.warning(f"Could not add result layer '{layer_name}': {str(e)}")
@@ -544,42 +746,14 @@ def display_map_with_st_folium():
         st.session_state.force_map_refresh = False
     
     # Use st_folium with the critical key parameter
-    map_data = st_folium(
+    st_folium(
         m,
         use_container_width=True,
         height=500,
         key=key_to_use,
-        # Set returned_objects to prevent auto reruns
-        returned_objects=["last_active_drawing"],
+        # Nothing is read back from the map, so panning, zooming and clicking
+        # neither rerun the app nor send map state back to Python
+        returned_objects=[],
     )
     
-    # If this is initialization or a forced refresh,
-    # we allow the map data to be processed without triggering rerun
-    if not st.session_state.map_initialized or force_refresh:
-        st.session_state.map_initialized = True
-        
-        # Process any map data from initialization
-        if map_data and 'center' in map_data and map_data['center'] is not None:
-            if isinstance(map_data['center'], dict) and 'lat' in map_data['center'] and 'lng' in map_data['center']:
-                st.session_state.map_center = [map_data['center']['lat'], map_data['center']['lng']]
-            else:
-                st.session_state.map_center = map_data['center']
-                
-        if map_data and 'zoom' in map_data and map_data['zoom'] is not None:
-            st.session_state.map_zoom = map_data['zoom']
-    
-    # Don't store map interaction data if we're in the middle of a workflow
-    # This preserves the zoom level when processing methods change
-    if 'processing_method_selector' not in st.session_state.last_clicked:
-        # Process map data to update session state
-        if map_data:
-            if 'center' in map_data and map_data['center'] is not None:
-                if isinstance(map_data['center'], dict) and 'lat' in map_data['center'] and 'lng' in map_data['center']:
-                    st.session_state.map_center = [map_data['center']['lat'], map_data['center']['lng']]
-                else:
-                    st.session_state.map_center = map_data['center']
-                    
-            if 'zoom' in map_data and map_data['zoom'] is not None:
-                st.session_state.map_zoom = map_data['zoom']
-    
     return force_refresh